@@ -6,8 +6,9 @@ from collections import deque
 import math
 
 class FFN:
-    def __init__(self, worker_id):
+    def __init__(self, worker_id, cost_F):
         self.worker_id = worker_id
+        self.cost_F = cost_F
         self.current_busy = False
         self.current_ending = -1
         self.buffer = deque()
@@ -15,12 +16,12 @@ class FFN:
     def load_batch(self, current_time, batch:Batch):
         self.buffer.append(batch)
         
-    def cycle_work(self, current_time, alpha_F, beta_F):
+    def cycle_work(self, current_time):
         if self.current_busy:
             if current_time < self.current_ending:
                 return
             self.current_busy = False
         if self.buffer:
             batch = self.buffer.pop()
-            self.current_ending = batch.FFN_processing(current_time, alpha_F, beta_F)
+            self.current_ending = batch.FFN_processing(current_time, self.cost_F)
             self.current_busy = True
@@ -0,0 +1,206 @@
+import argparse
+from typing import Dict, List, Tuple
+
+import main as sim
+
+# Closed-form steady-state model of the per-round pipeline. It assumes
+# every batch slot is refilled as soon as a request finishes (the buffer
+# never runs dry), so it describes the saturated part of an experiment.
+# A finite experiment is close to that only when every request slot
+# serves many requests; otherwise the start-up and the drain at the end
+# dominate and the prediction is marked as not saturated.
+
+# Requests per batch slot above which the drain is a small part of the run
+SATURATION_REQUESTS_PER_SLOT = 10
+
+
+def request_profile(max_prompt_len, next_token_prob):
+    """
+    Expected rounds per request and the round-averaged request length.
+
+    Initial lengths are uniform in [1, max_prompt_len]. A request of length
+    l runs k = min(G, max(max_prompt_len - l, 1)) rounds with G geometric in
+    next_token_prob, and has length l + j - 1 at its j-th attention. By the
+    renewal-reward argument a slot's average length is
+    E[sum of lengths over rounds] / E[k].
+    """
+    M = max_prompt_len
+    p = next_token_prob
+    total_rounds = 0.0
+    total_length = 0.0
+    for l in range(1, M + 1):
+        c = max(M - l, 1)
+        if p < 1:
+            rounds = (1 - p**c)/(1 - p)
+            # sum_{i<c} i*p^i
+            growth = p*(1 - c*p**(c - 1) + (c - 1)*p**c)/(1 - p)**2
+        else:
+            rounds = c
+            growth = c*(c - 1)/2
+        total_rounds += rounds
+        total_length += l*rounds + growth
+    return total_rounds/M, total_length/total_rounds
+
+
+def predict(num_batch, batch_size, server_costs: List[Tuple], cost_F,
+            max_prompt_len=4096, next_token_prob=0.95,
+            use_length_limit=False, batch_max_length=65536,
+            include_ffn=False, cycle_us=1.0, total_request=None) -> Dict:
+    """
+    Steady-state estimate for one configuration. server_costs holds the
+    (cost_A, cost_T) of every attention server, which may differ; cost_F is
+    that of FFN worker 0, the only worker the engine sends batches to.
+    Jittered costs contribute their expected value.
+
+    Attention is serialized per server, so with B batches of attention time
+    A the server needs B*A cycles per round, while a single batch cannot
+    come back faster than its own critical path. The reference loop hands a
+    batch from the A2F transfer straight back to attention, so by default
+    the critical path is A + T. With include_ffn the full A -> A2F -> FFN ->
+    F2A path is used, and the FFN worker adds its own serialized demand.
+    Every server runs at its own round time; round_time and the stage
+    figures are those of the slowest server.
+
+    With total_request, a batch holds at most its share of the requests,
+    and "saturated" tells whether the experiment is long enough for the
+    steady state to describe it.
+    """
+    num_server = len(server_costs)
+    rounds, mean_len = request_profile(max_prompt_len, next_token_prob)
+    occupancy = float(batch_size)
+    if use_length_limit:
+        # Dispatch stops admitting once the batch reaches its token limit
+        occupancy = min(occupancy, max(1.0, batch_max_length/mean_len))
+    saturated = True
+    if total_request is not None:
+        occupancy = min(occupancy, max(1.0, total_request/(num_server*num_batch)))
+        saturated = total_request >= SATURATION_REQUESTS_PER_SLOT*num_server*num_batch*batch_size
+    batch_tokens = occupancy*mean_len
+    num_req = round(occupancy)
+
+    F = cost_F.cost(num_req)
+    ffn_demand = num_server*num_batch*F
+
+    slowest = None
+    tokens_per_cycle = 0.0
+    for cost_A, cost_T in server_costs:
+        A = cost_A.cost(round(batch_tokens))
+        T = cost_T.cost(num_req)
+        demand = {"attention": num_batch*A}
+        if include_ffn:
+            critical_path = A + 2*T + F
+            demand["ffn"] = ffn_demand
+        else:
+            critical_path = A + T
+        round_time = max([critical_path] + list(demand.values()))
+        tokens_per_cycle += num_batch*occupancy/round_time
+        if slowest is None or round_time > slowest[0]:
+            slowest = (round_time, demand, A, T)
+
+    round_time, demand, A, T = slowest
+    utilization = {stage: d/round_time for stage, d in demand.items()}
+    bottleneck = max(utilization, key=utilization.get)
+    if utilization[bottleneck] < 1.0:
+        bottleneck = "critical_path"
+
+    return {
+        "round_time": round_time,
+        "round_time_us": round_time*cycle_us,
+        "tokens_per_cycle": tokens_per_cycle,
+        "tokens_per_us": tokens_per_cycle/cycle_us,
+        "bottleneck": bottleneck,
+        "utilization": utilization,
+        "stage_time": {"A": A, "T": T, "F": F},
+        "batch_occupancy": occupancy,
+        "batch_tokens": batch_tokens,
+        "rounds_per_request": rounds,
+        "saturated": saturated,
+    }
+
+
+def predict_args(args, include_ffn=False, cycle_us=1.0) -> Dict:
+    # Per-node costs exactly as the simulation builds them
+    server_nodes, ffn_nodes = sim.load_cluster_profile(args)
+    server_costs = []
+    for idx in range(args.num_server):
+        cost_A, cost_T, _ = sim.build_server_costs(args, server_nodes, idx)
+        server_costs.append((cost_A, cost_T))
+    cost_F = sim.build_FFN_cost(args, ffn_nodes, 0)
+    return predict(args.num_batch, args.batch_size, server_costs, cost_F,
+                   max_prompt_len=args.max_prompt_len,
+                   next_token_prob=args.next_token_prob,
+                   use_length_limit=args.use_length_limit,
+                   batch_max_length=args.batch_max_length,
+                   include_ffn=include_ffn, cycle_us=cycle_us,
+                   total_request=args.total_request)
+
+
+def dominated(a: Dict, b: Dict, margin=0.2) -> bool:
+    """
+    True if prediction b clearly beats a: no more hardware, no less
+    throughput, no longer rounds, and either strictly less hardware or
+    better by at least `margin` in throughput or round time. Both need a
+    "hardware" entry (attention servers plus FFN workers).
+    """
+    if b["hardware"] > a["hardware"]:
+        return False
+    if b["tokens_per_cycle"] < a["tokens_per_cycle"] or b["round_time"] > a["round_time"]:
+        return False
+    return (b["hardware"] < a["hardware"]
+            or b["tokens_per_cycle"] >= (1 + margin)*a["tokens_per_cycle"]
+            or (1 + margin)*b["round_time"] <= a["round_time"])
+
+
+def validate(args, include_ffn=False) -> Dict:
+    """
+    Run the full simulation for args and compare it with the prediction.
+    Simulated throughput includes the drain at the end of the experiment,
+    and avg_batch_cost weighs every batch equally, so a batch starved by
+    the fixed attention order inflates it even when throughput matches.
+    """
+    predicted = predict_args(args, include_ffn=include_ffn)
+    stats, global_time = sim.simulate(args)
+    simulated_round = stats.summary()["avg_batch_cost"]
+    simulated_tput = stats.total_generated_tokens/global_time
+    return {
+        "predicted_round_time": predicted["round_time"],
+        "simulated_round_time": simulated_round,
+        "round_time_error": (predicted["round_time"] - simulated_round)/simulated_round,
+        "predicted_tokens_per_cycle": predicted["tokens_per_cycle"],
+        "simulated_tokens_per_cycle": simulated_tput,
+        "tokens_per_cycle_error": (predicted["tokens_per_cycle"] - simulated_tput)/simulated_tput,
+        "bottleneck": predicted["bottleneck"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytical steady-state throughput model",
+                                     add_help=False)
+    parser.add_argument("--validate", action="store_true",
+                        help="also run the full simulation and report the model error")
+    parser.add_argument("--include_ffn", action="store_true",
+                        help="model the full A -> A2F -> FFN -> F2A round")
+    parser.add_argument("--cycle_us", type=float, default=1.0,
+                        help="microseconds per simulated cycle")
+    own, rest = parser.parse_known_args()
+    args = sim.parse_args(rest)
+
+    predicted = predict_args(args, include_ffn=own.include_ffn, cycle_us=own.cycle_us)
+    print(f"Round time: {predicted['round_time']} cycles ({predicted['round_time_us']:.1f} us)")
+    print(f"Throughput: {predicted['tokens_per_cycle']:.4f} tokens/cycle ({predicted['tokens_per_us']:.4f} tokens/us)")
+    print(f"Bottleneck: {predicted['bottleneck']}")
+    if not predicted["saturated"]:
+        print(f"Warning: {args.total_request} requests do not saturate the cluster "
+              f"(need about {SATURATION_REQUESTS_PER_SLOT} per request slot); "
+              f"the steady-state prediction does not describe this experiment")
+    for stage, util in predicted["utilization"].items():
+        print(f"  {stage} utilization: {util:.3f}")
+    if own.validate:
+        report = validate(args, include_ffn=own.include_ffn)
+        print(f"Simulated round time: {report['simulated_round_time']:.1f} "
+              f"(error {100*report['round_time_error']:+.1f}%)")
+        print(f"Simulated throughput: {report['simulated_tokens_per_cycle']:.4f} "
+              f"(error {100*report['tokens_per_cycle_error']:+.1f}%)")
+
+if __name__ == "__main__":
+    main()
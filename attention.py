@@ -4,8 +4,12 @@ from batch import Batch
 from typing import List, Dict, Tuple
 
 class Server:
-    def __init__(self, server_id, num_batches, batches: dict[int,Batch]):
+    def __init__(self, server_id, num_batches, batches: dict[int,Batch], cost_A, cost_T, cost_P=None):
         self.num_batches = num_batches
+        self.cost_A = cost_A # Attention cost of this server
+        self.cost_T = cost_T # Transfer cost of this server's link
+        self.cost_P = cost_P # Prefill cost of this server (prefill mode only)
+        self.network = None # Shared interconnect, transfers are independent if None
         self.batches = batches
         assert len(batches) == num_batches
         self.server_id = server_id
@@ -14,17 +18,14 @@ class Server:
     def load_request_to_batch(self, current_time, batch_id, request:Request):
         self.batches[batch_id].load_request(current_time, request)
 
-    def find_available_batch(self)-> List[Tuple[int, int, int, int]]:
+    def find_available_batch(self, current_time=0)-> List[Tuple[int, int, int, int]]:
         available_batches = []
         for batch_id, batch in self.batches.items():
-            if batch.num_req < batch.batch_size:
-                if batch.use_length_limit:
-                    if batch.length > batch.length_limit:
-                        continue
+            if batch.has_free_slot(current_time):
                 available_batches.append((batch.num_req, batch.length, batch_id, self.server_id))
         return available_batches
     
-    def cycle_work(self, current_time, stats, FFN_worker, alpha_T, beta_T):
+    def cycle_work(self, current_time, stats, FFN_worker):
         for batch_id, batch in self.batches.items():
             # if batch.status == 5: # Waiting for allocation in attention
             #     if self.current_busy == False:
@@ -44,24 +45,26 @@ class Server:
                 if batch.attention_now:
                     continue # Should be done in attention_work
                 if current_time >= batch.current_ending:
-                    batch.A2F_transmission(current_time, alpha_T, beta_T)
+                    batch.A2F_transmission(current_time, self.cost_T)
+                    if self.network is not None:
+                        self.network.start_flow(current_time, batch, self.network.ingress[FFN_worker.worker_id])
                     self.current_busy = False
             elif batch.status == 2:
                 if current_time >= batch.current_ending:
-                    batch.F2A_transmission(current_time, alpha_T, beta_T)
+                    batch.F2A_transmission(current_time, self.cost_T)
 
-    def attention_work(self, current_time, alpha_A, beta_A):
+    def attention_work(self, current_time):
         for batch_id, batch in self.batches.items():
             if batch.status == 5: # Waiting for allocation in attention
                 if self.current_busy == False:
-                    batch.Attention_processing(current_time, alpha_A, beta_A)
+                    batch.Attention_processing(current_time, self.cost_A, self.cost_P)
                     self.current_busy = True    
             elif batch.status == 1:
                 if not batch.attention_now:
                     continue
                 batch.attention_now = False
                 if self.current_busy == False:
-                    batch.Attention_processing(current_time, alpha_A, beta_A)
+                    batch.Attention_processing(current_time, self.cost_A, self.cost_P)
                     self.current_busy = True
                 else:
                     batch.status = 5
\ No newline at end of file
@@ -4,7 +4,7 @@ from request import Request
 from typing import List, Dict, Tuple
 
 class Batch:
-    def __init__(self, bids, batch_size,  use_length_limit=False, length_limit=0):
+    def __init__(self, bids, batch_size,  use_length_limit=False, length_limit=0, prefill=False, prefill_chunk=0):
         self.bids = bids  # List of request IDs in the batch
         self.requests :List[Request] = []  # Requests in the batch
         self.batch_size = batch_size # Maximal number of requests allowed
@@ -14,6 +14,12 @@ class Batch:
         self.length_limit = length_limit
         self.ever_served_request = 0
 
+        # Explicit prefill: prompts are prefilled before decoding, at most
+        # prefill_chunk tokens per round (0: whole prompts in one round)
+        self.prefill = prefill
+        self.prefill_chunk = prefill_chunk
+        self.prefill_pending = 0 # Prompt tokens in the batch not prefilled yet
+
         self.status = 0
         # 0: Empty
         # 1: Attention processing, 2: FFN processing
@@ -32,6 +38,7 @@ class Batch:
         self.F_finish:list[int] = []
         self.Acost:list[int] = []
         self.Fcost:list[int] = []
+        self.Pcost:list[int] = [] # Prefill part of each Acost (prefill mode only)
         
 
     def load_request(self, current_time, request:Request):
@@ -39,6 +46,9 @@ class Batch:
         request.start_processing(current_time, self.bids)
         self.length += request.length
         self.num_req += 1
+        if self.prefill:
+            request.prefill_remaining = request.length
+            self.prefill_pending += request.length
         if self.status == 0:
             self.status = 1
             self.attention_now = True
@@ -57,37 +67,58 @@ class Batch:
             #raise ValueError("Ever reached here")
         return True
         
-    def Attention_processing(self, current_time, alpha_A, beta_A):
-        # t_A(T)=alpha_A*T+beta_A
+    def Attention_processing(self, current_time, cost_A, cost_P=None):
+        # t_A(T), T = tokens in the batch
         self.status = 1
-        current_ending = current_time + alpha_A*self.length + beta_A
-        self.current_ending = math.ceil(current_ending)
+        if not self.prefill:
+            self.current_ending = cost_A.end_time(current_time, self.length)
+        else:
+            # Decode over the KV-resident tokens, then prefill this round's chunk
+            decode_ending = cost_A.end_time(current_time, self.length - self.prefill_pending)
+            chunk = self.schedule_prefill()
+            if chunk > 0:
+                self.current_ending = cost_P.end_time(decode_ending, chunk)
+            else:
+                self.current_ending = decode_ending
+            self.Pcost.append(self.current_ending - decode_ending)
 
         self.Acost.append(self.current_ending - current_time)
 
-    def FFN_processing(self, current_time, alpha_F, beta_F) -> int:
-        # t_F(T)=alpha_F*T+beta_F
+    def schedule_prefill(self) -> int:
+        # Spend this round's token budget on prompts in arrival order
+        budget = self.prefill_chunk if self.prefill_chunk > 0 else self.prefill_pending
+        scheduled = 0
+        for request in self.requests:
+            if budget == 0:
+                break
+            if request.prefill_remaining > 0:
+                chunk = min(request.prefill_remaining, budget)
+                request.prefill_remaining -= chunk
+                budget -= chunk
+                scheduled += chunk
+        self.prefill_pending -= scheduled
+        return scheduled
+
+    def FFN_processing(self, current_time, cost_F) -> int:
+        # t_F(T), T = requests in the batch
         self.status = 2
-        current_ending = current_time + alpha_F*self.num_req + beta_F
-        self.current_ending = math.ceil(current_ending)
+        self.current_ending = cost_F.end_time(current_time, self.num_req)
 
         self.Fcost.append(self.current_ending-current_time)
 
         return self.current_ending
 
-    def A2F_transmission(self, current_time, alpha_T, beta_T):
-        # t_T(T)=alpha_T*T+beta_T
+    def A2F_transmission(self, current_time, cost_T):
+        # t_T(T), T = requests in the batch
         self.status = 3
-        current_ending = current_time + alpha_T*self.num_req + beta_T
-        self.current_ending = math.ceil(current_ending)
+        self.current_ending = cost_T.end_time(current_time, self.num_req)
         
         self.A_finish.append(current_time) 
 
-    def F2A_transmission(self, current_time, alpha_T, beta_T):
-        # t_T(T)=alpha_T*T+beta_T
+    def F2A_transmission(self, current_time, cost_T):
+        # t_T(T), T = requests in the batch
         self.status = 4
-        current_ending = current_time + alpha_T*self.num_req + beta_T
-        self.current_ending = math.ceil(current_ending)
+        self.current_ending = cost_T.end_time(current_time, self.num_req)
 
         self.F_finish.append(current_time)
         
@@ -106,6 +137,8 @@ class Batch:
     def do_new_round(self, current_time, stats):
         self.collect_makespan(current_time)
         for request in self.requests:
+            if request.prefill_remaining > 0:
+                continue # Still prefilling, no token this round
             flag = request.do_new_round(current_time, stats)
             if flag:
                 self.length += 1
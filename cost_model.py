@@ -0,0 +1,298 @@
+import argparse
+import csv
+import math
+import random
+from bisect import bisect_left
+from typing import List, Tuple
+
+# Stage cost models. A stage (attention, FFN, transfer) maps a size x
+# (tokens in the batch, or number of requests) to a duration in cycles.
+# The simulator only calls `end_time` in the hot path.
+
+
+class LinearCost:
+    """
+    t(x) = alpha*x+beta, rounded up. This is the original idealized model,
+    and `end_time` keeps the original ceil(current_time + alpha*x + beta)
+    so results are unchanged.
+    """
+
+    def __init__(self, alpha, beta):
+        self.alpha = alpha
+        self.beta = beta
+
+    def end_time(self, current_time, x) -> int:
+        return math.ceil(current_time + self.alpha*x + self.beta)
+
+    def cost(self, x) -> int:
+        return math.ceil(self.alpha*x + self.beta)
+
+
+class TableCost:
+    """
+    Precomputed integer costs for every x in [0, size). A lookup in the
+    hot path is a single list index; x beyond the table is extrapolated
+    with the slope of the last fitted segment.
+    """
+
+    def __init__(self, table: List[int], tail_slope=0.0):
+        self.table = table
+        self.size = len(table)
+        self.tail_slope = tail_slope
+
+    def end_time(self, current_time, x) -> int:
+        if x < self.size:
+            return current_time + self.table[x]
+        return current_time + self._extrapolate(x)
+
+    def cost(self, x) -> int:
+        if x < self.size:
+            return self.table[x]
+        return self._extrapolate(x)
+
+    def _extrapolate(self, x) -> int:
+        last = self.size - 1
+        return math.ceil(self.table[last] + self.tail_slope*(x - last))
+
+
+class JitteredCost:
+    """
+    Stochastic stage times on top of a deterministic model: each execution
+    is scaled by a mean-1 lognormal factor, and with straggler_prob by an
+    extra straggler_slowdown. Factors are drawn a block at a time so the
+    hot path only advances an index.
+    """
+
+    def __init__(self, base, sigma=0.0, straggler_prob=0.0, straggler_slowdown=1.0,
+                 seed=0, block_size=4096):
+        self.base = base
+        self.sigma = sigma
+        self.straggler_prob = straggler_prob
+        self.straggler_slowdown = straggler_slowdown
+        self.rng = random.Random(seed)
+        self.block_size = block_size
+        self.mean_factor = 1 + straggler_prob*(straggler_slowdown - 1)
+        self.factors: List[float] = []
+        self.pos = 0
+
+    def _refill(self):
+        rng = self.rng
+        mu = -self.sigma*self.sigma/2
+        sigma = self.sigma
+        p = self.straggler_prob
+        slow = self.straggler_slowdown
+        self.factors = [
+            (rng.lognormvariate(mu, sigma) if sigma > 0 else 1.0)*(slow if rng.random() < p else 1.0)
+            for _ in range(self.block_size)
+        ]
+        self.pos = 0
+
+    def end_time(self, current_time, x) -> int:
+        if self.pos == len(self.factors):
+            self._refill()
+        factor = self.factors[self.pos]
+        self.pos += 1
+        return current_time + math.ceil((self.base.end_time(current_time, x) - current_time)*factor)
+
+    def cost(self, x) -> int:
+        # Expected cost, used for predictions and dispatch decisions
+        return math.ceil(self.base.cost(x)*self.mean_factor)
+
+
+class PiecewiseLinearFit:
+    """Linear interpolation between measured points, linear extrapolation outside."""
+
+    def __init__(self, points: List[Tuple[float, float]]):
+        if len(points) < 2:
+            raise ValueError("Piecewise-linear fit needs at least 2 points")
+        self.xs = [p[0] for p in points]
+        self.ys = [p[1] for p in points]
+
+    def segment(self, x):
+        pos = bisect_left(self.xs, x)
+        return min(max(pos, 1), len(self.xs) - 1)
+
+    def evaluate(self, x) -> float:
+        i = self.segment(x)
+        x0, x1 = self.xs[i-1], self.xs[i]
+        y0, y1 = self.ys[i-1], self.ys[i]
+        return y0 + (y1 - y0)*(x - x0)/(x1 - x0)
+
+    def tail_slope(self) -> float:
+        return (self.ys[-1] - self.ys[-2])/(self.xs[-1] - self.xs[-2])
+
+
+class StepFit:
+    """
+    Tile-quantized lookup: x costs the same as the smallest measured size
+    that is >= x, as a kernel padded up to its next tile would.
+    """
+
+    def __init__(self, points: List[Tuple[float, float]]):
+        if len(points) < 2:
+            raise ValueError("Step fit needs at least 2 points")
+        self.xs = [p[0] for p in points]
+        self.ys = [p[1] for p in points]
+
+    def evaluate(self, x) -> float:
+        pos = bisect_left(self.xs, x)
+        if pos < len(self.xs):
+            return self.ys[pos]
+        return self.ys[-1] + self.tail_slope()*(x - self.xs[-1])
+
+    def tail_slope(self) -> float:
+        return (self.ys[-1] - self.ys[-2])/(self.xs[-1] - self.xs[-2])
+
+
+class LeastSquaresFit:
+    """Single alpha*x+beta fitted to the profile, for comparison against the idealized model."""
+
+    def __init__(self, points: List[Tuple[float, float]]):
+        n = len(points)
+        if n < 2:
+            raise ValueError("Linear fit needs at least 2 points")
+        mean_x = sum(p[0] for p in points)/n
+        mean_y = sum(p[1] for p in points)/n
+        sxx = sum((p[0] - mean_x)**2 for p in points)
+        sxy = sum((p[0] - mean_x)*(p[1] - mean_y) for p in points)
+        self.alpha = sxy/sxx if sxx > 0 else 0.0
+        self.beta = mean_y - self.alpha*mean_x
+
+    def evaluate(self, x) -> float:
+        return self.alpha*x + self.beta
+
+    def tail_slope(self) -> float:
+        return self.alpha
+
+
+FIT_KINDS = {
+    "pwl": PiecewiseLinearFit,
+    "step": StepFit,
+    "linear": LeastSquaresFit,
+}
+
+
+def load_samples(path) -> List[Tuple[float, float]]:
+    """
+    Read the raw measured (tokens, cycles) rows of a CSV profile, in file
+    order. One header row is allowed before the first sample; any other
+    row that is not two numbers is reported with its line number.
+    """
+    samples = []
+    header_seen = False
+    with open(path, newline="") as f:
+        for lineno, row in enumerate(csv.reader(f), 1):
+            if not row or not row[0].strip() or row[0].strip().startswith("#"):
+                continue
+            try:
+                x = float(row[0])
+                y = float(row[1])
+            except (ValueError, IndexError):
+                if not samples and not header_seen:
+                    header_seen = True
+                    continue
+                raise ValueError(f"{path}:{lineno}: expected 'size,cycles', got {','.join(row)!r}")
+            samples.append((x, y))
+    if not samples:
+        raise ValueError(f"No samples found in profile {path}")
+    return samples
+
+
+def average_samples(samples) -> List[Tuple[float, float]]:
+    """Sorted fit points, repeated measurements of the same size averaged."""
+    by_size = {}
+    for x, y in samples:
+        by_size.setdefault(x, []).append(y)
+    return [(x, sum(ys)/len(ys)) for x, ys in sorted(by_size.items())]
+
+
+def load_profile(path) -> List[Tuple[float, float]]:
+    """
+    Read a measured (tokens, cycles) profile from CSV as fit points. A
+    header row is allowed. Repeated measurements of the same size are averaged.
+    """
+    return average_samples(load_samples(path))
+
+
+def fit_profile(points, kind="pwl"):
+    if kind not in FIT_KINDS:
+        raise ValueError(f"Unknown fit kind: {kind}")
+    return FIT_KINDS[kind](points)
+
+
+def precompute(model, max_x) -> TableCost:
+    """Tabulate ceil(model(x)) for x in [0, max_x]; costs never go below 0."""
+    table = [max(0, math.ceil(model.evaluate(x))) for x in range(int(max_x) + 1)]
+    return TableCost(table, model.tail_slope())
+
+
+def load_cost_model(path, kind, max_x) -> TableCost:
+    return precompute(fit_profile(load_profile(path), kind), max_x)
+
+
+def _error_summary(pairs):
+    abs_err = [abs(math.ceil(pred) - y) for y, pred in pairs]
+    rel_err = [abs(math.ceil(pred) - y)/abs(y) for y, pred in pairs if y != 0]
+    return {
+        "mae": sum(abs_err)/len(abs_err),
+        "max_abs": max(abs_err),
+        "mape": sum(rel_err)/len(rel_err) if rel_err else None,
+    }
+
+
+def calibration_error(model, samples):
+    """Absolute / relative error of the (integer) model cost against the raw measured samples."""
+    return _error_summary([(y, model.evaluate(x)) for x, y in samples])
+
+
+def cross_validation_error(samples, kind):
+    """
+    Leave-one-out error: refit without each interior size and predict its
+    raw samples. Interpolating fits pass through the averaged points, so
+    this is the number that says how well the profile resolution captures
+    the curve.
+    """
+    points = average_samples(samples)
+    pairs = []
+    for i in range(1, len(points) - 1):
+        model = fit_profile(points[:i] + points[i+1:], kind)
+        x = points[i][0]
+        pairs.extend((y, model.evaluate(x)) for sx, y in samples if sx == x)
+    if not pairs:
+        return None
+    return _error_summary(pairs)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fit a stage cost model to a measured profile")
+    parser.add_argument("profile", type=str,
+                        help="CSV file with (tokens, cycles) rows")
+    parser.add_argument("--kind", type=str, default="all", choices=["all"] + list(FIT_KINDS),
+                        help="fit kind to report, or all of them")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    samples = load_samples(args.profile)
+    points = average_samples(samples)
+    kinds = list(FIT_KINDS) if args.kind == "all" else [args.kind]
+    print(f"Profile: {args.profile} ({len(samples)} samples, {len(points)} sizes, "
+          f"x in [{points[0][0]:g}, {points[-1][0]:g}])")
+    for kind in kinds:
+        model = fit_profile(points, kind)
+        fit_err = calibration_error(model, samples)
+        cv_err = cross_validation_error(samples, kind)
+        line = f"{kind:>6}: in-sample MAE={fit_err['mae']:.2f} max={fit_err['max_abs']:.2f}"
+        if fit_err["mape"] is not None:
+            line += f" MAPE={100*fit_err['mape']:.2f}%"
+        if cv_err is not None:
+            line += f" | leave-one-out MAE={cv_err['mae']:.2f} max={cv_err['max_abs']:.2f}"
+            if cv_err["mape"] is not None:
+                line += f" MAPE={100*cv_err['mape']:.2f}%"
+        if kind == "linear":
+            line += f" | alpha={model.alpha:.6g} beta={model.beta:.6g}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import argparse
+import importlib
+import math
+import random
+import sys
+from typing import Dict, List, Tuple
+
+import main as sim
+import reference
+from stats import StatsCollector
+
+# Differential test harness: runs the reference cycle loop and a candidate
+# engine on many small randomized configurations and checks that they
+# produce the same experiment. A candidate is any callable
+# `engine(args) -> (StatsCollector, global_time)`, e.g. `main:simulate`.
+
+BATCH_FIELDS = ["Acost", "Fcost", "Round_cost"]
+SUMMARY_FIELDS = ["finished_requests", "avg_total_time", "avg_time_per_cycle_per_request",
+                  "avg_total_time_by_initial_length", "finished count", "num_batches", "avg_batch_cost"]
+
+
+def reference_run(args) -> Tuple[StatsCollector, int]:
+    """
+    The reference cycle loop: the frozen snapshot of the original Batch,
+    Server, FFN and main loop in reference.py, independent of the live
+    engine modules.
+    """
+    return reference.run(args)
+
+
+def random_config(rng: random.Random) -> Dict:
+    num_server = rng.randint(1, 3)
+    num_batch = rng.randint(1, 3)
+    # Enough requests that every batch is used at least once
+    total = rng.randint(num_server*num_batch, 40)
+    config = {
+        "num_server": num_server,
+        "num_batch": num_batch,
+        "batch_size": rng.randint(1, 8),
+        "use_length_limit": rng.random() < 0.5,
+        "batch_max_length": rng.randint(64, 4096),
+        "max_prompt_len": rng.choice([16, 64, 256, 1024]),
+        "next_token_prob": rng.choice([0.5, 0.8, 0.95]),
+        "basic_num": total,
+        "total_request": total,
+        "maximal_generation": total,
+        "alpha_A": round(rng.uniform(0.001, 0.5), 4),
+        "beta_A": round(rng.uniform(1, 600), 2),
+        "alpha_F": round(rng.uniform(0.001, 0.5), 4),
+        "beta_F": round(rng.uniform(1, 600), 2),
+        "alpha_T": round(rng.uniform(0.0001, 0.1), 5),
+        "beta_T": round(rng.uniform(1, 64), 2),
+    }
+    if rng.random() < 0.3:
+        # Trickle part of the load in over time
+        config["basic_num"] = rng.randint(0, total)
+        config["gen_prob"] = rng.choice([0.01, 0.05, 0.2])
+    return config
+
+
+def make_args(config: Dict):
+    args = sim.parse_args([])
+    args.out_prefix = "difftest"
+    for key, value in config.items():
+        setattr(args, key, value)
+    return args
+
+
+def _close(a, b, rel_tol, abs_tol):
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return math.isclose(a, b, rel_tol=rel_tol, abs_tol=abs_tol)
+    return a == b
+
+
+def compare(ref, cand, rel_tol=1e-9, abs_tol=1e-9) -> List[str]:
+    """Return human readable mismatches between two (stats, global_time) results."""
+    ref_stats, ref_time = ref
+    cand_stats, cand_time = cand
+    problems = []
+    if ref_time != cand_time:
+        problems.append(f"global_time {ref_time} != {cand_time}")
+
+    ref_records = {r["rid"]: r for r in ref_stats.records}
+    cand_records = {r["rid"]: r for r in cand_stats.records}
+    if ref_records.keys() != cand_records.keys():
+        missing = sorted(ref_records.keys() - cand_records.keys())
+        extra = sorted(cand_records.keys() - ref_records.keys())
+        problems.append(f"finished rids differ: missing={missing[:10]} extra={extra[:10]}")
+    for rid in sorted(ref_records.keys() & cand_records.keys()):
+        for field in ["completion_time", "rounds"]:
+            if ref_records[rid][field] != cand_records[rid][field]:
+                problems.append(f"rid {rid} {field}: {ref_records[rid][field]} != {cand_records[rid][field]}")
+
+    ref_batches = {b["batch_id"]: b for b in ref_stats.batch_info}
+    cand_batches = {b["batch_id"]: b for b in cand_stats.batch_info}
+    for bid in sorted(ref_batches.keys() | cand_batches.keys()):
+        if bid not in ref_batches or bid not in cand_batches:
+            problems.append(f"batch {bid} missing on one side")
+            continue
+        for field in BATCH_FIELDS:
+            a, b = ref_batches[bid][field], cand_batches[bid][field]
+            if len(a) != len(b) or not all(_close(x, y, rel_tol, abs_tol) for x, y in zip(a, b)):
+                problems.append(f"batch {bid} {field} differs (len {len(a)} vs {len(b)})")
+
+    ref_summary = ref_stats.summary()
+    cand_summary = cand_stats.summary()
+    for field in SUMMARY_FIELDS:
+        a, b = ref_summary.get(field), cand_summary.get(field)
+        if isinstance(a, dict) and isinstance(b, dict):
+            same = a.keys() == b.keys() and all(_close(a[k], b[k], rel_tol, abs_tol) for k in a)
+        else:
+            same = _close(a, b, rel_tol, abs_tol)
+        if not same:
+            problems.append(f"summary {field}: {a} != {b}")
+    return problems
+
+
+def check(config, candidate, rel_tol=1e-9) -> List[str]:
+    ref = reference_run(make_args(config))
+    cand = candidate(make_args(config))
+    return compare(ref, cand, rel_tol=rel_tol)
+
+
+def _simpler(config: Dict):
+    """Yield strictly simpler variants of a configuration, most aggressive first."""
+    slots = config["num_server"]*config["num_batch"]
+    for key in ["num_server", "num_batch"]:
+        if config[key] > 1:
+            yield dict(config, **{key: 1})
+            yield dict(config, **{key: config[key] - 1})
+    for key in ["batch_size", "max_prompt_len"]:
+        if config[key] > 1:
+            yield dict(config, **{key: 1})
+            yield dict(config, **{key: config[key]//2})
+    if config["total_request"] > slots:
+        for total in [slots, config["total_request"]//2, config["total_request"] - 1]:
+            total = max(total, slots)
+            basic = min(config["basic_num"], total)
+            yield dict(config, total_request=total, maximal_generation=total, basic_num=basic)
+    if config["use_length_limit"]:
+        yield dict(config, use_length_limit=False)
+    if config["basic_num"] < config["total_request"]:
+        yield dict(config, basic_num=config["total_request"])
+    for key in ["alpha_A", "alpha_F", "alpha_T"]:
+        if config[key] != 0:
+            yield dict(config, **{key: 0})
+    for key in ["beta_A", "beta_F", "beta_T"]:
+        if config[key] != 1:
+            yield dict(config, **{key: 1})
+        if config[key] != int(config[key]):
+            yield dict(config, **{key: float(math.ceil(config[key]))})
+
+
+def shrink(config, candidate, rel_tol=1e-9) -> Dict:
+    """Greedily simplify a failing configuration while it keeps failing."""
+    progress = True
+    while progress:
+        progress = False
+        for smaller in _simpler(config):
+            if smaller == config:
+                continue
+            try:
+                failing = len(check(smaller, candidate, rel_tol)) > 0
+            except Exception:
+                failing = False  # a different failure is not the one we shrink
+            if failing:
+                config = smaller
+                progress = True
+                break
+    return config
+
+
+def load_candidate(spec):
+    module_name, _, func_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), func_name or "simulate")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Differential test: reference cycle loop vs candidate engine")
+    parser.add_argument("--candidate", type=str, default="main:simulate",
+                        help="module:function of the engine under test")
+    parser.add_argument("--cases", type=int, default=200,
+                        help="number of randomized configurations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rel_tol", type=float, default=1e-9,
+                        help="relative tolerance for batch costs and summary metrics")
+    parser.add_argument("--no_shrink", action="store_true",
+                        help="report the first failing configuration as is")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    candidate = load_candidate(args.candidate)
+    rng = random.Random(args.seed)
+    for case in range(args.cases):
+        config = random_config(rng)
+        problems = check(config, candidate, args.rel_tol)
+        if problems:
+            print(f"Case {case} FAILED: {config}")
+            for p in problems[:20]:
+                print("  " + p)
+            if not args.no_shrink:
+                minimal = shrink(config, candidate, args.rel_tol)
+                print(f"Minimal reproducer: {minimal}")
+                for p in check(minimal, candidate, args.rel_tol)[:20]:
+                    print("  " + p)
+            sys.exit(1)
+    print(f"All {args.cases} cases match.")
+
+if __name__ == "__main__":
+    main()
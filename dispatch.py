@@ -0,0 +1,318 @@
+import heapq
+import random
+from attention import Server
+from batch import Batch
+from request import Request
+from typing import List, Dict, Tuple
+
+
+class DispatchPolicy:
+    """
+    Decides which batch receives the next request from the buffer.
+
+    Every cycle the main loop calls `refresh` once (O(B) over all batches,
+    the same scan the original loop did), then alternates `select` and
+    `loaded` for each request placed. `select` / `loaded` must stay O(1) or
+    O(log B) so large clusters are not dominated by dispatch cost.
+    """
+
+    def __init__(self, stored_batches: Dict[int, Batch]):
+        self.stored_batches = stored_batches
+
+    def refresh(self, current_time, servers: List[Server]):
+        raise NotImplementedError
+
+    def has_candidate(self) -> bool:
+        raise NotImplementedError
+
+    def select(self, request: Request) -> Tuple[int, int]:
+        """Remove and return (batch_id, server_id) of the chosen batch."""
+        raise NotImplementedError
+
+    def loaded(self, current_time, batch_id, server_id):
+        """Called after the request was loaded; re-offer the batch if it still has room."""
+        raise NotImplementedError
+
+
+class LeastLoadedPolicy(DispatchPolicy):
+    """
+    The original policy: min over (num_req, length, batch_id, server_id).
+    A heap gives the same choice as `min(available_batches)` in O(log B).
+    """
+
+    def __init__(self, stored_batches):
+        super().__init__(stored_batches)
+        self.heap: List[Tuple[int, int, int, int]] = []
+
+    def refresh(self, current_time, servers):
+        self.heap = []
+        for server in servers:
+            self.heap.extend(server.find_available_batch(current_time))
+        heapq.heapify(self.heap)
+
+    def has_candidate(self):
+        return len(self.heap) > 0
+
+    def select(self, request):
+        info = heapq.heappop(self.heap)
+        return info[2], info[3]
+
+    def loaded(self, current_time, batch_id, server_id):
+        batch = self.stored_batches[batch_id]
+        if batch.has_free_slot(current_time):
+            info0, info1 = batch.update_info(current_time)
+            heapq.heappush(self.heap, (info0, info1, batch_id, server_id))
+
+
+class PowerOfDPolicy(DispatchPolicy):
+    """
+    Power-of-d-choices: sample d candidate batches uniformly and take the
+    least loaded of them. Candidates live in a flat list with swap-remove,
+    so a selection costs O(d) independent of the cluster size.
+    """
+
+    def __init__(self, stored_batches, d=2, seed=0):
+        super().__init__(stored_batches)
+        self.d = d
+        self.rng = random.Random(seed)
+        self.candidates: List[Tuple[int, int]] = []
+
+    def refresh(self, current_time, servers):
+        self.candidates = []
+        for server in servers:
+            for info in server.find_available_batch(current_time):
+                self.candidates.append((info[2], info[3]))
+
+    def has_candidate(self):
+        return len(self.candidates) > 0
+
+    def select(self, request):
+        n = len(self.candidates)
+        best_pos = -1
+        best_key = None
+        for _ in range(min(self.d, n)):
+            pos = self.rng.randrange(n)
+            batch = self.stored_batches[self.candidates[pos][0]]
+            key = (batch.num_req, batch.length)
+            if best_key is None or key < best_key:
+                best_key = key
+                best_pos = pos
+        chosen = self.candidates[best_pos]
+        self.candidates[best_pos] = self.candidates[-1]
+        self.candidates.pop()
+        return chosen
+
+    def loaded(self, current_time, batch_id, server_id):
+        if self.stored_batches[batch_id].has_free_slot(current_time):
+            self.candidates.append((batch_id, server_id))
+
+
+class TokenBudgetPolicy(DispatchPolicy):
+    """
+    Best-fit bin packing against `Batch.length_limit`: the request goes to
+    the batch whose remaining token budget is the smallest one that still
+    fits the prompt. If no batch fits, the batch with the most room is used.
+    Ties go to the lowest batch id.
+
+    Candidates are bucketed by remaining budget in [0, limit] and a Fenwick
+    tree counts the candidates per bucket, so the best-fit successor query
+    and every insert/remove are O(log L) in the token limit L, independent
+    of the number of batches. Each bucket is a heap of (batch_id,
+    server_id). Batches already over the limit (possible without
+    --use_length_limit) never fit and sit in a separate heap that is only
+    used when nothing else is left.
+    """
+
+    def __init__(self, stored_batches):
+        super().__init__(stored_batches)
+        self.size = 1 + max((b.length_limit for b in stored_batches.values()), default=0)
+        self.tree = [0]*(self.size + 1)
+        self.buckets: Dict[int, List[Tuple[int, int]]] = {}
+        self.count = 0
+        self.over_limit: List[Tuple[int, int, int]] = []
+
+    def _update(self, budget, delta):
+        i = budget + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, budget):
+        """Number of candidates with budget <= `budget`."""
+        i = min(budget, self.size - 1) + 1
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _kth(self, k):
+        """Smallest budget b with prefix(b) >= k."""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] < k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+    def _push(self, batch: Batch, server_id):
+        budget = batch.length_limit - batch.length
+        if budget < 0:
+            heapq.heappush(self.over_limit, (-budget, batch.bids, server_id))
+            return
+        heapq.heappush(self.buckets.setdefault(budget, []), (batch.bids, server_id))
+        self._update(budget, 1)
+        self.count += 1
+
+    def refresh(self, current_time, servers):
+        # Clear only the buckets in use instead of rebuilding the whole tree
+        for budget, bucket in self.buckets.items():
+            self._update(budget, -len(bucket))
+        self.buckets = {}
+        self.count = 0
+        self.over_limit = []
+        for server in servers:
+            for info in server.find_available_batch(current_time):
+                self._push(self.stored_batches[info[2]], info[3])
+
+    def has_candidate(self):
+        return self.count > 0 or len(self.over_limit) > 0
+
+    def select(self, request):
+        if self.count == 0:
+            _, batch_id, server_id = heapq.heappop(self.over_limit)
+            return batch_id, server_id
+        k = self._prefix(request.length - 1) + 1 if request.length > 0 else 1
+        budget = self._kth(min(k, self.count))
+        bucket = self.buckets[budget]
+        batch_id, server_id = heapq.heappop(bucket)
+        if not bucket:
+            del self.buckets[budget]
+        self._update(budget, -1)
+        self.count -= 1
+        return batch_id, server_id
+
+    def loaded(self, current_time, batch_id, server_id):
+        batch = self.stored_batches[batch_id]
+        if batch.has_free_slot(current_time):
+            self._push(batch, server_id)
+
+
+class _ServerHeapPolicy(DispatchPolicy):
+    """
+    Two-level selection: a heap of servers ordered by `server_key`, and per
+    server a heap of its free batches ordered like LeastLoadedPolicy.
+    Popping a server, then one of its batches, is O(log S + log B/S).
+    """
+
+    def __init__(self, stored_batches):
+        super().__init__(stored_batches)
+        self.server_heap: List[tuple] = []
+        self.batch_heaps: Dict[int, List[Tuple[int, int, int]]] = {}
+        self.servers: Dict[int, Server] = {}
+        self.load: Dict[int, float] = {}
+        self.pending = (0, False)
+
+    def server_key(self, server: Server):
+        raise NotImplementedError
+
+    def on_loaded(self, server: Server, batch: Batch, delta_length, new_batch):
+        """Hook to update incremental per-server load after a request is loaded."""
+        None
+
+    def refresh(self, current_time, servers):
+        self.server_heap = []
+        self.batch_heaps = {}
+        for server in servers:
+            self.servers[server.server_id] = server
+            self.reset_server(server)
+            heap = [(info[0], info[1], info[2]) for info in server.find_available_batch(current_time)]
+            if heap:
+                heapq.heapify(heap)
+                self.batch_heaps[server.server_id] = heap
+                self.server_heap.append((self.server_key(server), server.server_id))
+        heapq.heapify(self.server_heap)
+
+    def reset_server(self, server: Server):
+        None
+
+    def has_candidate(self):
+        return len(self.server_heap) > 0
+
+    def select(self, request):
+        _, server_id = heapq.heappop(self.server_heap)
+        info = heapq.heappop(self.batch_heaps[server_id])
+        self.pending = (self.stored_batches[info[2]].length, info[0] == 0)
+        return info[2], server_id
+
+    def loaded(self, current_time, batch_id, server_id):
+        server = self.servers[server_id]
+        batch = self.stored_batches[batch_id]
+        old_length, new_batch = self.pending
+        self.on_loaded(server, batch, batch.length - old_length, new_batch)
+        heap = self.batch_heaps[server_id]
+        if batch.has_free_slot(current_time):
+            heapq.heappush(heap, (batch.num_req, batch.length, batch_id))
+        if heap:
+            heapq.heappush(self.server_heap, (self.server_key(server), server_id))
+
+
+class ServerAffinityPolicy(_ServerHeapPolicy):
+    """
+    Prefer servers whose attention engine is idle (`Server.current_busy`
+    is False), then the server holding the fewest requests, so new work
+    lands where it can start attention right away.
+    """
+
+    def reset_server(self, server):
+        self.load[server.server_id] = sum(b.num_req for b in server.batches.values())
+
+    def server_key(self, server):
+        return (server.current_busy, self.load[server.server_id])
+
+    def on_loaded(self, server, batch, delta_length, new_batch):
+        self.load[server.server_id] += 1
+
+
+class ShortestQueuePolicy(_ServerHeapPolicy):
+    """
+    Join-shortest-queue on predicted round time. Attention is serialized
+    per server, so a server's round time is predicted as the sum of its
+    own attention cost (alpha_A*length+beta_A by default) over its
+    non-empty batches.
+    """
+
+    def reset_server(self, server):
+        predicted = 0
+        for batch in server.batches.values():
+            if batch.num_req > 0:
+                predicted += server.cost_A.cost(batch.length)
+        self.load[server.server_id] = predicted
+
+    def server_key(self, server):
+        return self.load[server.server_id]
+
+    def on_loaded(self, server, batch, delta_length, new_batch):
+        self.load[server.server_id] += server.cost_A.cost(batch.length)
+        if not new_batch:
+            self.load[server.server_id] -= server.cost_A.cost(batch.length - delta_length)
+
+
+DISPATCH_POLICIES = ["least_loaded", "power_of_d", "token_budget", "affinity", "jsq"]
+
+
+def make_dispatch_policy(name, stored_batches, d=2, seed=0) -> DispatchPolicy:
+    if name == "least_loaded":
+        return LeastLoadedPolicy(stored_batches)
+    elif name == "power_of_d":
+        return PowerOfDPolicy(stored_batches, d=d, seed=seed)
+    elif name == "token_budget":
+        return TokenBudgetPolicy(stored_batches)
+    elif name == "affinity":
+        return ServerAffinityPolicy(stored_batches)
+    elif name == "jsq":
+        return ShortestQueuePolicy(stored_batches)
+    raise ValueError(f"Unknown dispatch policy: {name}")
@@ -0,0 +1,324 @@
+import argparse
+import asyncio
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import main as sim
+
+# Local simulation job service. Clients POST a JSON config (any main.py
+# argument, e.g. {"num_batch": 2, "batch_size": 64}) to /simulate and read
+# back newline-delimited JSON events: "queued", periodic "progress"
+# (global_time, finished_request), then "done" with the summary or
+# "error". Identical configs that are already in flight share one run.
+
+
+# Arguments naming files the server would open. Clients may only name
+# files inside the server's --profiles_dir.
+PATH_ARGS = ["profile_A", "profile_F", "profile_T", "profile_P", "cluster_profile"]
+
+
+def make_args(config: Dict, profiles_dir=None):
+    args = sim.parse_args([])
+    for key, value in config.items():
+        if not hasattr(args, key):
+            raise ValueError(f"Unknown simulation argument: {key}")
+        if key in PATH_ARGS and value:
+            if not profiles_dir:
+                raise ValueError(f"{key} is not allowed: the server has no --profiles_dir")
+            if not isinstance(value, str) or "/" in value or "\\" in value or value.startswith("."):
+                raise ValueError(f"{key} must be a file name inside the server's profiles directory")
+            value = os.path.join(profiles_dir, value)
+        setattr(args, key, value)
+    # Result files go to result/<out_prefix>_*.json; keep clients inside result/
+    prefix = args.out_prefix
+    if not isinstance(prefix, str) or "/" in prefix or "\\" in prefix or ".." in prefix:
+        raise ValueError(f"Invalid out_prefix: {prefix!r}")
+    return args
+
+
+def run_job(job_id, config, events, progress_every, profiles_dir=None):
+    """Worker process entry point."""
+    events.put((job_id, {"event": "started", "job": job_id}))
+    args = make_args(config, profiles_dir)
+
+    def progress(global_time, finished_requests):
+        events.put((job_id, {"event": "progress", "global_time": global_time,
+                             "finished_request": finished_requests}))
+
+    stats, global_time = sim.simulate(args, progress=progress, progress_every=progress_every)
+    if args.out_prefix:
+        stats.dump_records_to_json()
+        stats.dump_summary_to_json()
+        stats.dump_batch_info_to_json()
+    return {"global_time": global_time, "summary": stats.summary()}
+
+
+class Job:
+    def __init__(self, job_id, key, config):
+        self.job_id = job_id
+        self.key = key
+        self.config = config
+        self.subscribers: List[asyncio.Queue] = []
+        self.last_progress: Optional[Dict] = None
+        self.started = False
+
+    def publish(self, event):
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+
+class JobServer:
+    def __init__(self, workers, max_queue, progress_every=10000, profiles_dir=None):
+        self.workers = workers
+        self.profiles_dir = profiles_dir
+        self.max_queue = max_queue
+        self.progress_every = progress_every
+        # Workers are started lazily while client connections are open. A
+        # forked worker would inherit those sockets and keep them open, so
+        # clients would never see EOF; forkserver children start clean.
+        context = multiprocessing.get_context("forkserver")
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        self.manager = context.Manager()
+        self.events = self.manager.Queue()
+        self.jobs: Dict[int, Job] = {}
+        self.in_flight: Dict[str, Job] = {}
+        self.next_job_id = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start_relay(self):
+        # Worker progress arrives on a manager queue; a thread blocks on it
+        # and hands events to the event loop.
+        def relay():
+            while True:
+                item = self.events.get()
+                if item is None:
+                    return
+                self.loop.call_soon_threadsafe(self.on_progress, *item)
+        threading.Thread(target=relay, daemon=True).start()
+
+    def on_progress(self, job_id, event):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if event["event"] == "started":
+            self.mark_started(job)
+            return
+        job.last_progress = event
+        job.publish(event)
+
+    def mark_started(self, job: Job):
+        if not job.started:
+            job.started = True
+            job.publish({"event": "started", "job": job.job_id})
+
+    def submit(self, config) -> Tuple[Job, bool]:
+        """Return the job running this config and whether it was already in flight."""
+        args = make_args(config, self.profiles_dir)
+        key = json.dumps(vars(args), sort_keys=True)
+        if key in self.in_flight:
+            return self.in_flight[key], True
+        if len(self.in_flight) >= self.workers + self.max_queue:
+            raise OverflowError("Job queue is full")
+        job = Job(self.next_job_id, key, config)
+        self.next_job_id += 1
+        self.jobs[job.job_id] = job
+        self.in_flight[key] = job
+        future = self.loop.run_in_executor(self.pool, run_job, job.job_id, config,
+                                           self.events, self.progress_every, self.profiles_dir)
+        future.add_done_callback(lambda f: self.on_done(job, f))
+        return job, False
+
+    def on_done(self, job: Job, future):
+        del self.in_flight[job.key]
+        del self.jobs[job.job_id]
+        # The worker's "started" travels on the event queue and may still be
+        # behind the result
+        self.mark_started(job)
+        try:
+            result = future.result()
+            job.publish(dict(event="done", job=job.job_id, **result))
+        except Exception as e:
+            # Exception text can quote server-side files; keep it in the server log
+            print(f"Job {job.job_id} failed: {e!r}", file=sys.stderr)
+            message = "invalid configuration" if isinstance(e, (ValueError, OSError)) else "simulation failed"
+            job.publish({"event": "error", "job": job.job_id, "message": message})
+        job.publish(None)
+
+    def status(self):
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": [
+                {"job": job.job_id, "config": job.config, "subscribers": len(job.subscribers),
+                 "progress": job.last_progress}
+                for job in self.in_flight.values()
+            ],
+        }
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode()
+            parts = request_line.split()
+            if len(parts) < 2:
+                return
+            method, path = parts[0], parts[1]
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            if method == "GET" and path == "/status":
+                await self.respond(writer, 200, self.status())
+            elif method == "POST" and path == "/simulate":
+                await self.stream_job(writer, body)
+            else:
+                await self.respond(writer, 404, {"error": f"No route for {method} {path}"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, code, payload):
+        data = (json.dumps(payload) + "\n").encode()
+        writer.write(f"HTTP/1.1 {code} {http.client.responses[code]}\r\n"
+                     f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + data)
+        await writer.drain()
+
+    async def stream_job(self, writer, body):
+        try:
+            config = json.loads(body or b"{}")
+            job, deduplicated = self.submit(config)
+        except OverflowError as e:
+            await self.respond(writer, 503, {"error": str(e)})
+            return
+        except (ValueError, TypeError) as e:
+            await self.respond(writer, 400, {"error": str(e)})
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        job.subscribers.append(queue)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Connection: close\r\n\r\n")
+        first = {"event": "queued", "job": job.job_id, "deduplicated": deduplicated}
+        writer.write((json.dumps(first) + "\n").encode())
+        if job.started:
+            writer.write((json.dumps({"event": "started", "job": job.job_id}) + "\n").encode())
+        if job.last_progress is not None:
+            writer.write((json.dumps(job.last_progress) + "\n").encode())
+        try:
+            while True:
+                await writer.drain()
+                event = await queue.get()
+                if event is None:
+                    break
+                writer.write((json.dumps(event) + "\n").encode())
+            await writer.drain()
+        finally:
+            job.subscribers.remove(queue)
+
+    async def serve(self, host, port, unix_path=None):
+        self.loop = asyncio.get_running_loop()
+        self.start_relay()
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.remove(unix_path)
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+            print(f"Job server listening on {unix_path} with {self.workers} workers")
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            print(f"Job server listening on {host}:{port} with {self.workers} workers")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.events.put(None)
+            self.pool.shutdown(cancel_futures=True)
+            self.manager.shutdown()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix_path)
+
+
+def submit(config, host="127.0.0.1", port=8765, unix_path=None):
+    """
+    Client helper: submit a config and yield events as they arrive. The
+    last event is "done" (with "summary" and "global_time") or "error".
+    """
+    if unix_path:
+        conn = _UnixHTTPConnection(unix_path)
+    else:
+        conn = http.client.HTTPConnection(host, port)
+    body = json.dumps(config)
+    conn.request("POST", "/simulate", body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    if response.status != 200:
+        raise RuntimeError(f"Job server returned {response.status}: {response.read().decode()}")
+    try:
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        conn.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local simulation job server")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="run the job server")
+    serve.add_argument("--host", type=str, default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--unix", type=str, default="",
+                       help="listen on this Unix socket instead of TCP")
+    serve.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                       help="number of simulation worker processes")
+    serve.add_argument("--max_queue", type=int, default=64,
+                       help="jobs allowed to wait for a worker before submissions are rejected")
+    serve.add_argument("--progress_every", type=int, default=10000,
+                       help="cycles between progress events")
+    serve.add_argument("--profiles_dir", type=str, default="",
+                       help="directory clients may name profile_*/cluster_profile files from "
+                            "(by file name); without it those arguments are rejected")
+
+    client = sub.add_parser("submit", help="submit a config and print its events")
+    client.add_argument("config", type=str,
+                        help='JSON object of main.py arguments, e.g. \'{"num_batch": 2}\'')
+    client.add_argument("--host", type=str, default="127.0.0.1")
+    client.add_argument("--port", type=int, default=8765)
+    client.add_argument("--unix", type=str, default="")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "serve":
+        server = JobServer(args.workers, args.max_queue, args.progress_every, args.profiles_dir or None)
+        try:
+            asyncio.run(server.serve(args.host, args.port, args.unix or None))
+        except KeyboardInterrupt:
+            pass
+    else:
+        for event in submit(json.loads(args.config), args.host, args.port, args.unix or None):
+            print(json.dumps(event))
+
+if __name__ == "__main__":
+    main()
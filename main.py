@@ -1,5 +1,9 @@
 import math
 import argparse
+import copy
+import json
+import os
+from functools import lru_cache
 from generator import UniformGenerator, UniformRandomGenerator
 from attention import Server
 from typing import Dict, List, Tuple
@@ -7,9 +11,12 @@ from stats import StatsCollector
 from request import Request
 from FFN import FFN
 from batch import Batch
+from network import Network
+from dispatch import make_dispatch_policy, DISPATCH_POLICIES
+from cost_model import LinearCost, JitteredCost, load_cost_model, FIT_KINDS
 from collections import deque
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Simulation Experiment Controller")
 
     parser.add_argument("--generator", type=int, default=1,
@@ -54,6 +61,47 @@ def parse_args():
     parser.add_argument("--beta_T", type=float, default=16.0)
     parser.add_argument("--beta_F", type=float, default=512.0)
 
+    parser.add_argument("--profile_A", type=str, default="",
+                        help="CSV (tokens, cycles) profile for attention; replaces alpha_A/beta_A")
+    parser.add_argument("--profile_F", type=str, default="",
+                        help="CSV (requests, cycles) profile for FFN; replaces alpha_F/beta_F")
+    parser.add_argument("--profile_T", type=str, default="",
+                        help="CSV (requests, cycles) profile for A2F/F2A transfer; replaces alpha_T/beta_T")
+    parser.add_argument("--profile_kind", type=str, default="pwl", choices=list(FIT_KINDS),
+                        help="model fitted to the profiles: piecewise-linear, step lookup or least-squares line")
+
+    parser.add_argument("--prefill", action="store_true",
+                        help="model prompt prefill at the attention server before decoding")
+    parser.add_argument("--prefill_chunk", type=int, default=0,
+                        help="per-round prefill token budget of a batch (0: whole prompts in one round)")
+    parser.add_argument("--alpha_P", type=float, default=0.2)
+    parser.add_argument("--beta_P", type=float, default=64.0)
+    parser.add_argument("--profile_P", type=str, default="",
+                        help="CSV (tokens, cycles) profile for prefill; replaces alpha_P/beta_P")
+
+    parser.add_argument("--cluster_profile", type=str, default="",
+                        help="JSON file with per-server / per-FFN-worker cost parameters")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="sigma of the mean-1 lognormal factor on attention and FFN stage times")
+    parser.add_argument("--link_jitter", type=float, default=0.0,
+                        help="sigma of the mean-1 lognormal factor on transfer times")
+    parser.add_argument("--straggler_prob", type=float, default=0.0,
+                        help="probability that an attention or FFN stage runs as a straggler")
+    parser.add_argument("--straggler_slowdown", type=float, default=4.0,
+                        help="stage time multiplier of a straggler")
+
+    parser.add_argument("--network", type=str, default="none", choices=["none", "fair", "fifo"],
+                        help="share the A2F ingress link of FFN worker 0 between concurrent transfers (fair-share or FIFO)")
+    parser.add_argument("--link_capacity", type=float, default=1.0,
+                        help="FFN link bandwidth in units of one server's line rate")
+    parser.add_argument("--link_latency", type=int, default=0,
+                        help="cycles of each transfer that are fixed latency rather than bandwidth")
+
+    parser.add_argument("--dispatch", type=str, default="least_loaded", choices=DISPATCH_POLICIES,
+                        help="policy used to place buffered requests into batches")
+    parser.add_argument("--dispatch_d", type=int, default=2,
+                        help="number of sampled batches for the power_of_d policy")
+
     parser.add_argument(
         "--out_prefix",
         type=str,
@@ -63,12 +111,113 @@ def parse_args():
     
     
     
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
-def main():
-    args = parse_args()
-    stats = StatsCollector(args.out_prefix)
-    
+@lru_cache(maxsize=None)
+def _cached_cost_model(path, mtime, kind, max_x):
+    return load_cost_model(path, kind, max_x)
+
+def cached_cost_model(path, kind, max_x):
+    # Tables are read-only, so nodes sharing a profile share one table. The
+    # file's mtime is part of the key: long-lived processes (the job server)
+    # must pick up a profile that was re-measured in place.
+    return _cached_cost_model(path, os.path.getmtime(path), kind, max_x)
+
+def build_cost_models(args):
+    # Attention cost is indexed by batch tokens, FFN and transfer by requests.
+    # A batch never holds more than batch_size requests of at most
+    # max_prompt_len tokens, which bounds the precomputed tables.
+    max_tokens = args.batch_size*args.max_prompt_len
+    max_reqs = args.batch_size
+    if args.profile_A:
+        cost_A = cached_cost_model(args.profile_A, args.profile_kind, max_tokens)
+    else:
+        cost_A = LinearCost(args.alpha_A, args.beta_A)
+    if args.profile_F:
+        cost_F = cached_cost_model(args.profile_F, args.profile_kind, max_reqs)
+    else:
+        cost_F = LinearCost(args.alpha_F, args.beta_F)
+    if args.profile_T:
+        cost_T = cached_cost_model(args.profile_T, args.profile_kind, max_reqs)
+    else:
+        cost_T = LinearCost(args.alpha_T, args.beta_T)
+    return cost_A, cost_F, cost_T
+
+def build_prefill_cost(args):
+    if args.profile_P:
+        return cached_cost_model(args.profile_P, args.profile_kind, args.batch_size*args.max_prompt_len)
+    return LinearCost(args.alpha_P, args.beta_P)
+
+# Arguments a cluster profile may set per node: stage costs and noise only.
+# Shape, workload and dispatch stay global.
+NODE_COST_KEYS = [
+    "alpha_A", "beta_A", "alpha_F", "beta_F", "alpha_T", "beta_T", "alpha_P", "beta_P",
+    "profile_A", "profile_F", "profile_T", "profile_P",
+    "jitter", "link_jitter", "straggler_prob", "straggler_slowdown",
+]
+
+def load_cluster_profile(args) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Per-node overrides from --cluster_profile:
+        {"servers": [{"count": 4, "alpha_A": 0.2}, {"beta_T": 32}],
+         "ffn": [{"alpha_F": 0.05}]}
+    Entries apply in order (each to `count` nodes, default 1); nodes past
+    the end of a list use the global arguments. Only FFN worker 0 is used,
+    so "ffn" may describe at most one worker.
+    """
+    if not args.cluster_profile:
+        return [], []
+    with open(args.cluster_profile) as f:
+        profile = json.load(f)
+    expanded = []
+    for key in ["servers", "ffn"]:
+        nodes = []
+        for entry in profile.get(key, []):
+            entry = dict(entry)
+            count = entry.pop("count", 1)
+            for name in entry:
+                if name not in NODE_COST_KEYS:
+                    raise ValueError(f"Cluster profile entries may only set {', '.join(NODE_COST_KEYS)} "
+                                     f"and count, got: {name}")
+            nodes.extend([entry]*count)
+        expanded.append(nodes)
+    if len(expanded[1]) > 1:
+        # The main loop sends every batch to FFN worker 0
+        raise ValueError("Cluster profile may describe only one FFN worker: only worker 0 receives batches")
+    return expanded[0], expanded[1]
+
+def node_args(args, nodes: List[Dict], idx):
+    if idx >= len(nodes):
+        return args
+    merged = copy.copy(args)
+    for name, value in nodes[idx].items():
+        setattr(merged, name, value)
+    return merged
+
+def add_jitter(cost, sigma, straggler_prob, straggler_slowdown, seed):
+    if sigma <= 0 and straggler_prob <= 0:
+        return cost
+    return JitteredCost(cost, sigma, straggler_prob, straggler_slowdown, seed=seed)
+
+def build_server_costs(args, server_nodes: List[Dict], idx):
+    """Attention, transfer and prefill (None unless --prefill) cost of server idx."""
+    node = node_args(args, server_nodes, idx)
+    cost_A, _, cost_T = build_cost_models(node)
+    cost_A = add_jitter(cost_A, node.jitter, node.straggler_prob, node.straggler_slowdown, f"A{idx}")
+    cost_T = add_jitter(cost_T, node.link_jitter, 0.0, 1.0, f"T{idx}")
+    cost_P = None
+    if args.prefill:
+        cost_P = add_jitter(build_prefill_cost(node), node.jitter, node.straggler_prob,
+                            node.straggler_slowdown, f"P{idx}")
+    return cost_A, cost_T, cost_P
+
+def build_FFN_cost(args, ffn_nodes: List[Dict], idx):
+    node = node_args(args, ffn_nodes, idx)
+    _, cost_F, _ = build_cost_models(node)
+    return add_jitter(cost_F, node.jitter, node.straggler_prob, node.straggler_slowdown, f"F{idx}")
+
+def build_servers(args) -> Tuple[List[Server], Dict[int, Batch]]:
+    server_nodes, _ = load_cluster_profile(args)
     num_servers = args.num_server
     servers = []
 
@@ -81,14 +230,20 @@ def main():
     for idx in range(num_servers):
         batches: Dict[int, Batch] = {}
         for i in range(num_batch):
-            new_batch = Batch(batch_id, batch_size, use_length_limit, args.batch_max_length)
+            new_batch = Batch(batch_id, batch_size, use_length_limit, args.batch_max_length,
+                              args.prefill, args.prefill_chunk)
             batches[batch_id] =  new_batch
             stored_batches[batch_id] = new_batch
             batch_id += 1
-        server = Server(idx, args.num_batch, batches)
+        cost_A, cost_T, cost_P = build_server_costs(args, server_nodes, idx)
+        server = Server(idx, args.num_batch, batches, cost_A, cost_T, cost_P)
         servers.append(server)
+    return servers, stored_batches
+
+GENERATOR_SEED = 4
 
-    generator_seed = 4
+def build_generator(args):
+    generator_seed = GENERATOR_SEED
     if args.generator == 0:
         generator = UniformGenerator(
             #arranger=arranger,
@@ -110,27 +265,51 @@ def main():
             maximal_generation = args.maximal_generation,
             basic_length=args.basic_num
         ) 
+    return generator
 
+def build_FFN_workers(args) -> List[FFN]:
+    _, ffn_nodes = load_cluster_profile(args)
     FFN_workers: List[FFN] = []
     num_FFN = args.num_FFN
     for FFN_id in range(num_FFN):
-        FFN_worker = FFN(FFN_id)
+        FFN_worker = FFN(FFN_id, build_FFN_cost(args, ffn_nodes, FFN_id))
         FFN_workers.append(FFN_worker)
+    return FFN_workers
+
+def build_network(args, servers: List[Server]):
+    if args.network == "none":
+        return None
+    # The main loop sends every batch to FFN worker 0, the only link with traffic
+    network = Network(1, args.link_capacity, args.network, args.link_latency)
+    for server in servers:
+        server.network = network
+    return network
+
+def simulate(args, stats=None, progress=None, progress_every=10000):
+    """
+    Run one experiment until args.total_request requests have finished.
+    Returns the StatsCollector (with batch info recorded) and the number of
+    simulated cycles. If given, progress(global_time, finished_requests) is
+    called every progress_every cycles.
+    """
+    if stats is None:
+        stats = StatsCollector(args.out_prefix)
+    servers, stored_batches = build_servers(args)
+    num_batch = args.num_batch
+    generator = build_generator(args)
+    FFN_workers = build_FFN_workers(args)
+    network = build_network(args, servers)
 
     global_time = 0
     finished_requests = 0
     test_print = False
 
-    alpha_A = args.alpha_A
-    alpha_F = args.alpha_F
-    alpha_T = args.alpha_T
-    beta_A = args.beta_A
-    beta_F = args.beta_F
-    beta_T = args.beta_T
-
     buffer = deque()
     req_inq = 0
 
+    dispatcher = make_dispatch_policy(args.dispatch, stored_batches, d=args.dispatch_d,
+                                      seed=GENERATOR_SEED)
+
     # Use single FFN worker for current experiment
     FFN_server = FFN_workers[0]
     # TODO: Main Loop
@@ -139,43 +318,32 @@ def main():
         for req in newly_generated_reqs:
             buffer.append(req)
             req_inq += 1
+        if network is not None:
+            network.advance(global_time)
         for server in servers:
-            server.cycle_work(global_time, stats, FFN_server, alpha_T, beta_T)
-
-        available_batches : List[Tuple[int, int, int, int]] = []
-        for server in servers:
-            extend_batches = server.find_available_batch()
-            available_batches.extend(extend_batches)
+            server.cycle_work(global_time, stats, FFN_server)
 
-        while available_batches and buffer:
-            #print("Here 154")
+        dispatcher.refresh(global_time, servers)
+        while buffer and dispatcher.has_candidate():
             if test_print:
-                for batch1 in available_batches:
-                    print("Batch info ",batch1)
                 print("Buufer size: ",len(buffer))
             request = buffer.pop()
-            best_batch_info = min(available_batches)
-            batch_id0 = best_batch_info[2]
-            server_id0 = best_batch_info[3]
-            best_batch = stored_batches[batch_id0]
-            target_server = servers[server_id0]
-            target_server.load_request_to_batch(global_time, best_batch_info[2], request)
-            available_batches.remove(best_batch_info)
-            if best_batch.has_free_slot(global_time):
-                info0, info1 = best_batch.update_info(current_time=global_time)
-                new_info = (info0, info1, batch_id0, server_id0)
-                available_batches.append(new_info)
+            batch_id0, server_id0 = dispatcher.select(request)
+            servers[server_id0].load_request_to_batch(global_time, batch_id0, request)
+            dispatcher.loaded(global_time, batch_id0, server_id0)
 
         for server in servers:
             if test_print:
                 print("Server ID: ",server.server_id)
                 
-            server.attention_work(global_time, alpha_A, beta_A)
+            server.attention_work(global_time)
 
-        FFN_server.cycle_work(global_time, alpha_F, beta_F)
+        FFN_server.cycle_work(global_time)
 
         finished_requests = stats.finished_request
         global_time += 1
+        if progress is not None and global_time % progress_every == 0:
+            progress(global_time, finished_requests)
 
         if test_print:
             print("Global Time: ", global_time)
@@ -194,6 +362,15 @@ def main():
 
     for batch_id in range(len(stored_batches)):
         stats.record_batch(stored_batches[batch_id])
+    stats.set_run_info(global_time, vars(args))
+    if network is not None:
+        stats.network = network.report(global_time)
+    return stats, global_time
+
+def main():
+    args = parse_args()
+    stats, global_time = simulate(args)
+    finished_requests = stats.finished_request
 
     print("Experiment finished.")
     print(f"Total cycles: {global_time}")
@@ -0,0 +1,129 @@
+import heapq
+import math
+from batch import Batch
+from typing import List, Dict
+
+# Shared interconnect for A2F transfers. Each FFN worker that receives
+# batches has an ingress link of `capacity` times a single server's line
+# rate. Only ingress is modeled: a batch goes from the end of its A2F
+# transfer straight back to attention, so the FFN stage and the F2A
+# transfer never run and an egress link would never carry a flow.
+# Concurrent transfers on a link share it either fairly
+# (processor sharing, each flow capped at line rate) or FIFO (flows filled
+# in arrival order). Rates only change when a flow starts or finishes, so
+# completion times are recomputed at those events only; the per-cycle cost
+# is a peek at the event heap.
+
+
+class Flow:
+    __slots__ = ("batch", "remaining", "work", "latency", "rate", "version", "start")
+
+    def __init__(self, batch: Batch, work, latency, start):
+        self.batch = batch
+        self.remaining = work # Cycles of transfer left at line rate
+        self.work = work
+        self.latency = latency # Fixed part of the transfer, not shared
+        self.rate = 0.0
+        self.version = 0
+        self.start = start
+
+
+class Link:
+    def __init__(self, name, capacity, policy):
+        self.name = name
+        self.capacity = capacity
+        self.policy = policy
+        self.flows: List[Flow] = [] # Arrival order
+        self.last_update = 0
+
+        self.busy_time = 0.0 # Time with at least one active flow
+        self.used_time = 0.0 # Integral of allocated rate / capacity
+        self.num_flows = 0
+        self.max_concurrent = 0
+        self.total_slowdown = 0.0
+
+    def advance(self, t):
+        dt = t - self.last_update
+        if dt > 0 and self.flows:
+            total_rate = 0.0
+            for flow in self.flows:
+                flow.remaining -= flow.rate*dt
+                total_rate += flow.rate
+            self.busy_time += dt
+            self.used_time += total_rate*dt/self.capacity
+        self.last_update = t
+
+    def allocate(self):
+        if self.policy == "fair":
+            share = min(1.0, self.capacity/len(self.flows)) if self.flows else 0.0
+            for flow in self.flows:
+                flow.rate = share
+        else:
+            left = self.capacity
+            for flow in self.flows:
+                flow.rate = min(1.0, left)
+                left -= flow.rate
+
+
+class Network:
+    def __init__(self, num_FFN, capacity=1.0, policy="fair", latency=0):
+        self.latency = latency
+        self.ingress = [Link(f"ffn{i}_in", capacity, policy) for i in range(num_FFN)]
+        self.events = [] # (bandwidth finish time, seq, link, flow, version)
+        self.seq = 0
+
+    def start_flow(self, current_time, batch: Batch, link: Link):
+        """
+        Put the transfer the batch just started onto a shared link. The
+        batch's current_ending (set from its solo transfer cost) is replaced
+        by the completion time under sharing and kept up to date.
+        """
+        solo = batch.current_ending - current_time
+        latency = min(self.latency, solo)
+        work = solo - latency
+        if work <= 0:
+            return
+        link.advance(current_time)
+        link.flows.append(Flow(batch, work, latency, current_time))
+        link.num_flows += 1
+        link.max_concurrent = max(link.max_concurrent, len(link.flows))
+        self.reschedule(link, current_time)
+
+    def reschedule(self, link: Link, t):
+        link.allocate()
+        for flow in link.flows:
+            flow.version += 1
+            if flow.rate > 0:
+                finish = t + flow.remaining/flow.rate
+                self.seq += 1
+                heapq.heappush(self.events, (finish, self.seq, link, flow, flow.version))
+                flow.batch.current_ending = math.ceil(finish) + flow.latency
+            else:
+                flow.batch.current_ending = math.inf # Queued behind earlier flows
+
+    def advance(self, current_time):
+        """Complete every flow whose bandwidth phase ends by current_time."""
+        events = self.events
+        while events and events[0][0] <= current_time:
+            finish, _, link, flow, version = heapq.heappop(events)
+            if version != flow.version:
+                continue # Superseded by a later reschedule
+            link.advance(finish)
+            link.flows.remove(flow)
+            link.total_slowdown += (finish - flow.start)/flow.work
+            flow.batch.current_ending = math.ceil(finish) + flow.latency
+            self.reschedule(link, finish)
+
+    def report(self, total_time) -> Dict[str, Dict]:
+        report = {}
+        for link in self.ingress:
+            link.advance(total_time)
+            completed = link.num_flows - len(link.flows)
+            report[link.name] = {
+                "utilization": link.used_time/total_time if total_time else 0.0,
+                "busy_fraction": link.busy_time/total_time if total_time else 0.0,
+                "flows": link.num_flows,
+                "max_concurrent": link.max_concurrent,
+                "avg_slowdown": link.total_slowdown/completed if completed else None,
+            }
+        return report
@@ -0,0 +1,222 @@
+import argparse
+import glob
+import json
+import os
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Optional
+
+# Incremental Pareto frontier over experiment summaries. A point trades
+# throughput per worker (maximized) against a latency percentile and the
+# hardware cost of attention servers plus FFN workers (both minimized).
+#
+# Points are grouped by hardware cost. Inside a group the non-dominated
+# points form a staircase: sorted by latency, throughput strictly rising.
+# Checking or inserting a point is then a bisect per cheaper (or dearer)
+# group plus the removal of one contiguous run, never a rescan.
+#
+# Every point is also kept by name, so a rewritten summary replaces its
+# earlier point. Removing a point that was on the frontier (or best for
+# its ratio) can expose points it dominated, so that case rebuilds the
+# frontier from all points; removing any other point is a single bisect.
+
+
+class _Staircase:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.throughputs: List[float] = []
+        self.points: List[Dict] = []
+
+    def dominates(self, latency, throughput) -> bool:
+        # The best throughput at latency <= l is the last such point
+        idx = bisect_right(self.latencies, latency) - 1
+        return idx >= 0 and self.throughputs[idx] >= throughput
+
+    def remove_dominated(self, latency, throughput) -> List[Dict]:
+        start = bisect_left(self.latencies, latency)
+        end = start
+        while end < len(self.points) and self.throughputs[end] <= throughput:
+            end += 1
+        removed = self.points[start:end]
+        del self.latencies[start:end]
+        del self.throughputs[start:end]
+        del self.points[start:end]
+        return removed
+
+    def insert(self, point):
+        pos = bisect_left(self.latencies, point["latency"])
+        self.latencies.insert(pos, point["latency"])
+        self.throughputs.insert(pos, point["throughput_per_worker"])
+        self.points.insert(pos, point)
+
+
+class ParetoFrontier:
+    def __init__(self, latency="p99", server_cost=1.0, ffn_cost=1.0):
+        self.latency = latency
+        self.server_cost = server_cost
+        self.ffn_cost = ffn_cost
+        self.costs: List[float] = []
+        self.levels: Dict[float, _Staircase] = {}
+        self.best_by_ratio: Dict[str, Dict] = {}
+        self.points: Dict[str, Dict] = {}
+        self.next_unnamed = 0
+
+    @property
+    def num_points(self):
+        return len(self.points)
+
+    def make_point(self, summary: Dict, name=None) -> Optional[Dict]:
+        config = summary.get("config")
+        if not config or "tokens_per_cycle" not in summary:
+            return None
+        latency = summary.get("latency_percentiles", {}).get(self.latency)
+        if latency is None:
+            return None
+        num_server = config["num_server"]
+        num_FFN = config["num_FFN"]
+        return {
+            "name": name,
+            "num_server": num_server,
+            "num_FFN": num_FFN,
+            "num_batch": config["num_batch"],
+            "batch_size": config["batch_size"],
+            "ratio": f"{num_server}:{num_FFN}",
+            "hardware": self.server_cost*num_server + self.ffn_cost*num_FFN,
+            "throughput_per_worker": summary["tokens_per_cycle"]/(num_server + num_FFN),
+            "latency": latency,
+            "avg_total_time": summary.get("avg_total_time"),
+            "avg_batch_cost": summary.get("avg_batch_cost"),
+        }
+
+    def add(self, summary: Dict, name=None) -> bool:
+        """
+        Add one summary; returns True if it is on the frontier afterwards.
+        A summary with the name of an earlier one replaces it.
+        """
+        if name is not None and name in self.points:
+            self.remove(name)
+        point = self.make_point(summary, name)
+        if point is None:
+            return False
+        if name is None:
+            name = f"#{self.next_unnamed}"
+            self.next_unnamed += 1
+        self.points[name] = point
+        self._update_ratio(point)
+        return self._insert(point)
+
+    def remove(self, name):
+        point = self.points.pop(name)
+        level = self.levels.get(point["hardware"])
+        on_frontier = False
+        if level is not None:
+            # Latencies on a staircase are distinct
+            pos = bisect_left(level.latencies, point["latency"])
+            on_frontier = pos < len(level.points) and level.points[pos] is point
+        if on_frontier or self.best_by_ratio.get(point["ratio"]) is point:
+            self._rebuild()
+
+    def _rebuild(self):
+        self.costs = []
+        self.levels = {}
+        self.best_by_ratio = {}
+        for point in self.points.values():
+            self._update_ratio(point)
+            self._insert(point)
+
+    def _insert(self, point) -> bool:
+        cost = point["hardware"]
+        latency = point["latency"]
+        throughput = point["throughput_per_worker"]
+        upto = bisect_right(self.costs, cost)
+        for c in self.costs[:upto]:
+            if self.levels[c].dominates(latency, throughput):
+                return False
+        for c in self.costs[bisect_left(self.costs, cost):]:
+            self.levels[c].remove_dominated(latency, throughput)
+        if cost not in self.levels:
+            insort(self.costs, cost)
+            self.levels[cost] = _Staircase()
+        self.levels[cost].insert(point)
+        return True
+
+    def _update_ratio(self, point):
+        best = self.best_by_ratio.get(point["ratio"])
+        key = (point["throughput_per_worker"], -point["latency"])
+        if best is None or key > (best["throughput_per_worker"], -best["latency"]):
+            self.best_by_ratio[point["ratio"]] = point
+
+    def frontier(self) -> List[Dict]:
+        points = []
+        for c in self.costs:
+            points.extend(self.levels[c].points)
+        return points
+
+    def export(self, path):
+        frontier = self.frontier()
+        on_frontier = set(id(p) for p in frontier)
+        by_ratio = {}
+        for ratio, point in sorted(self.best_by_ratio.items()):
+            by_ratio[ratio] = dict(point, on_frontier=id(point) in on_frontier)
+        with open(path, "w") as f:
+            json.dump({
+                "latency": self.latency,
+                "num_points": self.num_points,
+                "frontier": frontier,
+                "best_by_ratio": by_ratio,
+            }, f, indent=2)
+
+
+def ingest_dir(frontier: ParetoFrontier, directory, seen: Dict[str, float]) -> int:
+    """
+    Add every *_summary.json not seen yet, or replace its point if it was
+    rewritten since; returns how many were added.
+    """
+    added = 0
+    for path in glob.glob(os.path.join(directory, "*_summary.json")):
+        mtime = os.path.getmtime(path)
+        if seen.get(path) == mtime:
+            continue
+        try:
+            with open(path) as f:
+                summary = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue  # still being written, retry next poll
+        seen[path] = mtime
+        name = os.path.basename(path)[:-len("_summary.json")]
+        frontier.add(summary, name)
+        added += 1
+    return added
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pareto frontier over experiment summaries")
+    parser.add_argument("directory", type=str, nargs="?", default="result",
+                        help="directory holding *_summary.json files")
+    parser.add_argument("--latency", type=str, default="p99", choices=["p50", "p90", "p99"],
+                        help="latency percentile traded against throughput")
+    parser.add_argument("--server_cost", type=float, default=1.0,
+                        help="hardware cost of one attention server")
+    parser.add_argument("--ffn_cost", type=float, default=1.0,
+                        help="hardware cost of one FFN worker")
+    parser.add_argument("--out", type=str, default="result/pareto_frontier.json")
+    parser.add_argument("--watch", type=float, default=0,
+                        help="keep polling the directory every this many seconds")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    frontier = ParetoFrontier(args.latency, args.server_cost, args.ffn_cost)
+    seen: Dict[str, float] = {}
+    while True:
+        added = ingest_dir(frontier, args.directory, seen)
+        if added:
+            frontier.export(args.out)
+            print(f"{frontier.num_points} summaries, {len(frontier.frontier())} on the frontier -> {args.out}")
+        if args.watch <= 0:
+            break
+        time.sleep(args.watch)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import math
+from collections import deque
+from typing import List, Dict, Tuple
+
+from generator import UniformGenerator, UniformRandomGenerator
+from request import Request
+from stats import StatsCollector
+
+# Frozen copy of the original simulator (Batch, Server, FFN and the main
+# loop, with the idealized ceil(alpha*x+beta) stage costs) used as the
+# oracle by difftest.py. Nothing else may import this module, and it must
+# not be optimized or refactored: changes to the engine are checked
+# against it. The only departure from the original code is the
+# find_available_batch length check, which uses has_free_slot like the
+# refill path (an intended behavior fix).
+#
+# Requests, generators and StatsCollector are shared with the engine; they
+# are the workload and the measurement, not the engine under test.
+
+GENERATOR_SEED = 4
+
+
+class Batch:
+    def __init__(self, bids, batch_size,  use_length_limit=False, length_limit=0):
+        self.bids = bids
+        self.requests: List[Request] = []
+        self.batch_size = batch_size
+        self.length = 0
+        self.num_req = 0
+        self.use_length_limit = use_length_limit
+        self.length_limit = length_limit
+        self.ever_served_request = 0
+
+        self.status = 0
+        self.current_ending = 0
+        self.attention_now = False
+        self.doing_FFN = False
+
+        self.round_cost: List[int] = []
+        self.A_arrival: List[int] = []
+        self.current_A_arrival: int = 0
+        self.A_finish: List[int] = []
+        self.F_arrival: List[int] = []
+        self.F_finish: List[int] = []
+        self.Acost: List[int] = []
+        self.Fcost: List[int] = []
+
+    def load_request(self, current_time, request: Request):
+        self.requests.append(request)
+        request.start_processing(current_time, self.bids)
+        self.length += request.length
+        self.num_req += 1
+        if self.status == 0:
+            self.status = 1
+            self.attention_now = True
+
+    def finish_request(self, current_time, request: Request) -> bool:
+        if request not in self.requests:
+            raise ValueError("Request not in batch")
+        self.ever_served_request += 1
+        self.requests.remove(request)
+        self.length -= (request.length-1)
+        self.num_req -= 1
+        if self.num_req == 0:
+            self.status = 0
+        return True
+
+    def Attention_processing(self, current_time, alpha_A, beta_A):
+        self.status = 1
+        current_ending = current_time + alpha_A*self.length + beta_A
+        self.current_ending = math.ceil(current_ending)
+        self.Acost.append(self.current_ending - current_time)
+
+    def FFN_processing(self, current_time, alpha_F, beta_F) -> int:
+        self.status = 2
+        current_ending = current_time + alpha_F*self.num_req + beta_F
+        self.current_ending = math.ceil(current_ending)
+        self.Fcost.append(self.current_ending-current_time)
+        return self.current_ending
+
+    def A2F_transmission(self, current_time, alpha_T, beta_T):
+        self.status = 3
+        current_ending = current_time + alpha_T*self.num_req + beta_T
+        self.current_ending = math.ceil(current_ending)
+        self.A_finish.append(current_time)
+
+    def F2A_transmission(self, current_time, alpha_T, beta_T):
+        self.status = 4
+        current_ending = current_time + alpha_T*self.num_req + beta_T
+        self.current_ending = math.ceil(current_ending)
+        self.F_finish.append(current_time)
+
+    def F2A_transmission_end(self, current_time):
+        self.status = 1
+        self.attention_now = True
+        self.A_arrival.append(current_time)
+        self.round_cost.append((current_time-self.current_A_arrival))
+        self.current_A_arrival = current_time
+
+    def A2F_transmission_end(self, current_time):
+        self.status = 6
+        self.F_arrival.append(current_time)
+
+    def do_new_round(self, current_time, stats):
+        for request in self.requests:
+            flag = request.do_new_round(current_time, stats)
+            if flag:
+                self.length += 1
+            else:
+                self.finish_request(current_time, request)
+
+    def update_info(self, current_time):
+        return self.num_req, self.length
+
+    def has_free_slot(self, current_time) -> bool:
+        if self.batch_size <= self.num_req:
+            return False
+        if self.use_length_limit:
+            if self.length >= self.length_limit:
+                return False
+        return True
+
+
+class Server:
+    def __init__(self, server_id, num_batches, batches: Dict[int, Batch]):
+        self.num_batches = num_batches
+        self.batches = batches
+        assert len(batches) == num_batches
+        self.server_id = server_id
+        self.current_busy = False
+
+    def load_request_to_batch(self, current_time, batch_id, request: Request):
+        self.batches[batch_id].load_request(current_time, request)
+
+    def find_available_batch(self, current_time) -> List[Tuple[int, int, int, int]]:
+        available_batches = []
+        for batch_id, batch in self.batches.items():
+            if batch.has_free_slot(current_time):
+                available_batches.append((batch.num_req, batch.length, batch_id, self.server_id))
+        return available_batches
+
+    def cycle_work(self, current_time, stats, FFN_worker, alpha_T, beta_T):
+        for batch_id, batch in self.batches.items():
+            if batch.status == 3:
+                if current_time >= batch.current_ending:
+                    batch.F2A_transmission_end(current_time)
+                    batch.do_new_round(current_time, stats)
+            elif batch.status == 4:
+                if current_time >= batch.current_ending:
+                    batch.A2F_transmission_end(current_time)
+                    FFN_worker.load_batch(current_time, batch)
+            elif batch.status == 1:
+                if batch.attention_now:
+                    continue
+                if current_time >= batch.current_ending:
+                    batch.A2F_transmission(current_time, alpha_T, beta_T)
+                    self.current_busy = False
+            elif batch.status == 2:
+                if current_time >= batch.current_ending:
+                    batch.F2A_transmission(current_time, alpha_T, beta_T)
+
+    def attention_work(self, current_time, alpha_A, beta_A):
+        for batch_id, batch in self.batches.items():
+            if batch.status == 5:
+                if self.current_busy == False:
+                    batch.Attention_processing(current_time, alpha_A, beta_A)
+                    self.current_busy = True
+            elif batch.status == 1:
+                if not batch.attention_now:
+                    continue
+                batch.attention_now = False
+                if self.current_busy == False:
+                    batch.Attention_processing(current_time, alpha_A, beta_A)
+                    self.current_busy = True
+                else:
+                    batch.status = 5
+
+
+class FFN:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.current_busy = False
+        self.current_ending = -1
+        self.buffer = deque()
+
+    def load_batch(self, current_time, batch: Batch):
+        self.buffer.append(batch)
+
+    def cycle_work(self, current_time, alpha_F, beta_F):
+        if self.current_busy:
+            if current_time < self.current_ending:
+                return
+            self.current_busy = False
+        if self.buffer:
+            batch = self.buffer.pop()
+            self.current_ending = batch.FFN_processing(current_time, alpha_F, beta_F)
+            self.current_busy = True
+
+
+def record_batch(stats: StatsCollector, batch: Batch):
+    rounds = len(batch.round_cost)
+    stats.batch_info.append({
+        "batch_id": batch.bids,
+        "served_requests": batch.ever_served_request,
+        "Acost": batch.Acost,
+        "Fcost": batch.Fcost,
+        "Round_cost": batch.round_cost,
+        "Avg_Round_cost": sum(batch.round_cost)/rounds if rounds > 0 else None,
+    })
+
+
+def run(args) -> Tuple[StatsCollector, int]:
+    """The original main loop, returning (stats, global_time). Do not optimize."""
+    stats = StatsCollector(args.out_prefix)
+
+    servers: List[Server] = []
+    stored_batches: Dict[int, Batch] = {}
+    batch_id = 0
+    for idx in range(args.num_server):
+        batches: Dict[int, Batch] = {}
+        for i in range(args.num_batch):
+            new_batch = Batch(batch_id, args.batch_size, args.use_length_limit, args.batch_max_length)
+            batches[batch_id] = new_batch
+            stored_batches[batch_id] = new_batch
+            batch_id += 1
+        servers.append(Server(idx, args.num_batch, batches))
+
+    if args.generator == 0:
+        generator = UniformGenerator(
+            next_token_prob=args.next_token_prob,
+            seed=GENERATOR_SEED,
+            rate=args.rate,
+            max_length=args.max_prompt_len,
+            num_per_cyc=args.gen_req_per_cyc,
+            maximal_generation=args.maximal_generation
+        )
+    else:
+        generator = UniformRandomGenerator(
+            next_token_prob=args.next_token_prob,
+            seed=GENERATOR_SEED,
+            rate=args.gen_prob,
+            max_length=args.max_prompt_len,
+            num_per_cyc=args.gen_req_per_cyc,
+            maximal_generation=args.maximal_generation,
+            basic_length=args.basic_num
+        )
+
+    FFN_server = FFN(0)
+    alpha_A, beta_A = args.alpha_A, args.beta_A
+    alpha_F, beta_F = args.alpha_F, args.beta_F
+    alpha_T, beta_T = args.alpha_T, args.beta_T
+
+    buffer = deque()
+    global_time = 0
+    finished_requests = 0
+    while finished_requests < args.total_request:
+        newly_generated_reqs = generator.step(global_time)
+        for req in newly_generated_reqs:
+            buffer.append(req)
+        for server in servers:
+            server.cycle_work(global_time, stats, FFN_server, alpha_T, beta_T)
+
+        available_batches: List[Tuple[int, int, int, int]] = []
+        for server in servers:
+            available_batches.extend(server.find_available_batch(global_time))
+
+        while available_batches and buffer:
+            request = buffer.pop()
+            best_batch_info = min(available_batches)
+            batch_id0 = best_batch_info[2]
+            server_id0 = best_batch_info[3]
+            best_batch = stored_batches[batch_id0]
+            servers[server_id0].load_request_to_batch(global_time, batch_id0, request)
+            available_batches.remove(best_batch_info)
+            if best_batch.has_free_slot(global_time):
+                info0, info1 = best_batch.update_info(current_time=global_time)
+                available_batches.append((info0, info1, batch_id0, server_id0))
+
+        for server in servers:
+            server.attention_work(global_time, alpha_A, beta_A)
+
+        FFN_server.cycle_work(global_time, alpha_F, beta_F)
+
+        finished_requests = stats.finished_request
+        global_time += 1
+
+    for batch_id in range(len(stored_batches)):
+        record_batch(stats, stored_batches[batch_id])
+    return stats, global_time
@@ -15,11 +15,13 @@ class Request:
         self.proc_end_times = []  # list of processing end times for each round
 
         self.start_processing_time = None  # time when processing starts
+        self.first_token_time = None  # time when the first token is generated
         self.completion_time = None  # time when request is completed
         self.finished = False  # whether the request is finished
 
         self.rng = random.Random(seed + rid)  # random generator for this request
         self.batch_id = None  # batch id the request is assigned to
+        self.prefill_remaining = 0  # prompt tokens not prefilled yet (prefill mode only)
         # Statistics
         self.cyc_used = 0  # total cycles used
 
@@ -29,6 +31,8 @@ class Request:
         self.length += 1
         self.rounds += 1
         self.proc_end_times.append(current_time)
+        if self.first_token_time is None:
+            self.first_token_time = current_time
         if self.rng.random() < self.next_token_prob and self.length < self.max_possible_length:
             return True
         else:
@@ -1,9 +1,18 @@
 import json
+import math
 import os
 from request import Request
 from batch import Batch
 from collections import defaultdict
 
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q/100*len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
 class StatsCollector:
     def __init__(self, prefix: str=""):
         self.records = []  
@@ -18,6 +27,10 @@ class StatsCollector:
         self.total_avg_round_time = 0
         self.count_avg_round = 0   
         
+        self.total_cycles = None
+        self.config = None
+        self.network = None # Per-link utilization when transfers share links
+
         self.prefix = prefix
         self.output_dir = "result"
         self.length_distribution = {
@@ -65,6 +78,17 @@ class StatsCollector:
         else:
             total_time = None
 
+        # total_time starts when the request is loaded into a batch; ttft
+        # starts at arrival and so includes queue_time spent in the buffer
+        if req.start_processing_time is not None:
+            queue_time = req.start_processing_time - req.arrival
+        else:
+            queue_time = None
+        if req.first_token_time is not None:
+            ttft = req.first_token_time - req.arrival
+        else:
+            ttft = None
+
         if req.rounds > 0 and total_time is not None:
             avg_time_per_round = total_time / req.rounds
         else:
@@ -86,6 +110,8 @@ class StatsCollector:
             "startal_time": req.start_processing_time,
             "completion_time": req.completion_time,
             "total_time": total_time,
+            "queue_time": queue_time,
+            "ttft": ttft,
             "avg_time_per_round": avg_time_per_round,
 
             # rounds & processing
@@ -105,7 +131,8 @@ class StatsCollector:
             for round_cost in batch.round_cost:
                 rounds += 1
                 tot_cost += round_cost
-        avg_cost = tot_cost/rounds
+        # A batch that never received a request has no rounds
+        avg_cost = tot_cost/rounds if rounds > 0 else None
 
         self.batch_info.append(
             {
@@ -117,6 +144,13 @@ class StatsCollector:
                 "Avg_Round_cost": avg_cost
             }
         )
+        if batch.prefill:
+            self.batch_info[-1]["Pcost"] = batch.Pcost
+
+    def set_run_info(self, total_cycles, config=None):
+        """Experiment length and the arguments it ran with, reported in the summary."""
+        self.total_cycles = total_cycles
+        self.config = config
 
     def summary(self):
         """
@@ -126,6 +160,9 @@ class StatsCollector:
             return {}
 
         total_time_sum = 0
+        total_times = []
+        ttfts = []
+        queue_times = []
         total_cycle_time_sum = 0
         cycle_time_count = 0
 
@@ -150,6 +187,11 @@ class StatsCollector:
 
             total_time = completion - arrival
             total_time_sum += total_time
+            total_times.append(total_time)
+            if r["ttft"] is not None:
+                ttfts.append(r["ttft"])
+            if r["queue_time"] is not None:
+                queue_times.append(r["queue_time"])
 
             # avg per-cycle time (only if rounds > 0)
             if rounds > 0:
@@ -184,11 +226,22 @@ class StatsCollector:
         total_batch = 0
         batch_round_cost = 0
         for b in self.batch_info:
+            if b["Avg_Round_cost"] is None:
+                continue
             total_batch += 1
             batch_round_cost += b["Avg_Round_cost"]
-        batch_round_cost /= total_batch
+        batch_round_cost = batch_round_cost/total_batch if total_batch > 0 else None
+
+        total_times.sort()
+        latency_percentiles = {
+            f"p{q}": percentile(total_times, q) for q in [50, 90, 99]
+        }
+        ttfts.sort()
+        ttft_percentiles = {
+            f"p{q}": percentile(ttfts, q) for q in [50, 90, 99]
+        }
 
-        return {
+        summary = {
             "finished_requests": self.finished_request,
             #"vip_requests": len(buckets["vip"]),
             "avg_total_time": avg_total_time,
@@ -197,8 +250,20 @@ class StatsCollector:
             "finished count": self.length_distribution,
 
             "num_batches": total_batch,
-            "avg_batch_cost": batch_round_cost
+            "avg_batch_cost": batch_round_cost,
+            "latency_percentiles": latency_percentiles,
+            "avg_ttft": sum(ttfts)/len(ttfts) if ttfts else None,
+            "ttft_percentiles": ttft_percentiles,
+            "avg_queue_time": sum(queue_times)/len(queue_times) if queue_times else None,
         }
+        if self.total_cycles:
+            summary["total_cycles"] = self.total_cycles
+            summary["tokens_per_cycle"] = self.total_generated_tokens/self.total_cycles
+        if self.network is not None:
+            summary["network"] = self.network
+        if self.config is not None:
+            summary["config"] = self.config
+        return summary
 
     def dump_batch_info_to_json(self):
         """将所有 request 记录输出到 JSON 文件"""
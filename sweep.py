@@ -0,0 +1,84 @@
+import argparse
+import copy
+import itertools
+from typing import Dict, List
+
+import main as sim
+from analytic import predict_args, dominated
+
+# Grid sweep over cluster shapes. The analytical model predicts every
+# point first, and configurations that are clearly dominated (more
+# hardware for less throughput) are skipped before any simulation runs.
+
+
+def int_list(text):
+    return [int(x) for x in text.split(",")]
+
+
+def sweep_configs(base_args, num_servers, num_batches, batch_sizes, num_FFNs) -> List[Dict]:
+    points = []
+    for S, B, n, F in itertools.product(num_servers, num_batches, batch_sizes, num_FFNs):
+        args = copy.copy(base_args)
+        args.num_server = S
+        args.num_batch = B
+        args.batch_size = n
+        args.num_FFN = F
+        args.out_prefix = f"{base_args.out_prefix}_s{S}_b{B}_n{n}_f{F}"
+        points.append({"args": args, "hardware": S + F})
+    return points
+
+
+def prune(points: List[Dict], margin=0.2, include_ffn=False) -> List[Dict]:
+    """
+    Attach predictions and drop points dominated by another point. Only
+    points whose workload saturates the cluster are compared; the others
+    are always simulated.
+    """
+    for point in points:
+        point.update(predict_args(point["args"], include_ffn=include_ffn))
+    saturated = [p for p in points if p["saturated"]]
+    if len(saturated) < len(points):
+        print(f"Warning: {len(points) - len(saturated)} configurations are not saturated by "
+              f"{points[0]['args'].total_request} requests and are not pruned")
+    return [a for a in points
+            if not a["saturated"] or not any(dominated(a, b, margin) for b in saturated if b is not a)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep cluster shapes with analytical pruning",
+                                     add_help=False)
+    parser.add_argument("--num_servers", type=int_list, default=[1, 2, 4])
+    parser.add_argument("--num_batches", type=int_list, default=[1, 2, 3])
+    parser.add_argument("--batch_sizes", type=int_list, default=[16])
+    parser.add_argument("--num_FFNs", type=int_list, default=[1])
+    parser.add_argument("--prune_margin", type=float, default=0.2,
+                        help="skip a point if another has no more hardware and this much more predicted throughput")
+    parser.add_argument("--no_prune", action="store_true")
+    parser.add_argument("--include_ffn", action="store_true",
+                        help="predict with the full A -> A2F -> FFN -> F2A round")
+    own, rest = parser.parse_known_args()
+    base_args = sim.parse_args(rest)
+    if not base_args.out_prefix:
+        base_args.out_prefix = "sweep"
+
+    points = sweep_configs(base_args, own.num_servers, own.num_batches, own.batch_sizes, own.num_FFNs)
+    if own.no_prune:
+        survivors = points
+    else:
+        survivors = prune(points, own.prune_margin, own.include_ffn)
+    print(f"Simulating {len(survivors)} of {len(points)} configurations")
+
+    for point in survivors:
+        args = point["args"]
+        stats, global_time = sim.simulate(args)
+        stats.dump_records_to_json()
+        stats.dump_summary_to_json()
+        stats.dump_batch_info_to_json()
+        predicted = point.get("tokens_per_cycle")
+        line = f"{args.out_prefix}: {global_time} cycles, {stats.total_generated_tokens/global_time:.4f} tokens/cycle"
+        if predicted is not None:
+            line += f" (predicted {predicted:.4f})"
+        print(line)
+
+if __name__ == "__main__":
+    main()